@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+"""
+Measure the overhead of `processr.metrics.Metrics` on `process` and
+`process_many`, with latency sampling disabled, at 1% and at 100%.
+
+    PYTHONPATH=. python benchmarks/metrics.py
+"""
+
+from timeit import default_timer
+
+from processr.metrics import Metrics
+from processr.processr import process, process_many, ShapeCache
+
+COUNT = 200000
+REPEAT = 7
+
+PIPELINE = [
+    ('filter_records', lambda d: d['id'] % 10),
+    ('transform_values', {'score': float}),
+    ('rename_keys', {'id': 'record_id'}),
+]
+
+RECORDS = [{'id': i, 'score': str(i), 'status': 'ok'} for i in range(COUNT)]
+
+
+def run_process(metrics):
+    shape_cache = ShapeCache()
+    for d in RECORDS:
+        process(d, PIPELINE, shape_cache=shape_cache, metrics=metrics)
+
+
+def run_process_many(metrics):
+    for _ in process_many(RECORDS, PIPELINE, metrics=metrics):
+        pass
+
+
+def main():
+    variants = [('no metrics', None)] + [
+        ('%g%%' % (sample_rate * 100), sample_rate)
+        for sample_rate in (0, 0.01, 1)
+    ]
+    print('%d records, best of %d interleaved runs' % (COUNT, REPEAT))
+    print('%-14s %-12s %9s %9s' % ('', 'sampling', 'time', 'overhead'))
+    for name, f in (('process', run_process),
+                    ('process_many', run_process_many)):
+        timings = dict((label, []) for label, _ in variants)
+        for _ in range(REPEAT):
+            for label, sample_rate in variants:
+                metrics = None if sample_rate is None \
+                    else Metrics(sample_rate=sample_rate)
+                start = default_timer()
+                f(metrics)
+                timings[label].append(default_timer() - start)
+
+        baseline = min(timings['no metrics'])
+        for label, _ in variants:
+            elapsed = min(timings[label])
+            print('%-14s %-12s %8.3fs %8.1f%%' % (
+                name, label, elapsed,
+                100 * (elapsed - baseline) / baseline))
+
+
+if __name__ == '__main__':
+    main()
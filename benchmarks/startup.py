@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+"""
+Compare the startup time of a job using one custom stage out of many,
+when stage modules are imported eagerly or discovered through entry
+points and imported on first use. Every stage module simulates a heavy
+import by sleeping for `IMPORT_TIME` seconds.
+
+    PYTHONPATH=. python benchmarks/startup.py
+"""
+
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+from timeit import default_timer
+
+STAGES = 20
+IMPORT_TIME = 0.02
+REPEAT = 3
+
+STAGE_MODULE = '''
+import time
+time.sleep(%r)
+
+
+def stage(d, stage_opts):
+    return d
+'''
+
+EAGER = '''
+from processr.processr import process, StageDefinitions
+stage_definitions = StageDefinitions(discover=False)
+for i in range(%d):
+    module = __import__('bench_stage_%%d' %% i)
+    stage_definitions['stage_%%d' %% i] = module.stage
+process({'a': 1}, [('stage_0', None)], stage_definitions)
+'''
+
+LAZY = '''
+from processr.processr import process, StageDefinitions
+process({'a': 1}, [('stage_0', None)], StageDefinitions())
+'''
+
+
+def make_plugin(path):
+    dist_info = os.path.join(path, 'bench_stages-0.1.dist-info')
+    os.mkdir(dist_info)
+    with open(os.path.join(dist_info, 'METADATA'), 'w') as f:
+        f.write('Metadata-Version: 2.1\nName: bench-stages\nVersion: 0.1\n')
+    with open(os.path.join(dist_info, 'entry_points.txt'), 'w') as f:
+        f.write('[processr.stages]\n')
+        for i in range(STAGES):
+            f.write('stage_%d = bench_stage_%d:stage\n' % (i, i))
+            with open(os.path.join(path, 'bench_stage_%d.py' % i), 'w') as m:
+                m.write(STAGE_MODULE % IMPORT_TIME)
+
+
+def run(script, path):
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(
+        [path, os.getcwd(), env.get('PYTHONPATH', '')])
+    env['PYTHONDONTWRITEBYTECODE'] = '1'
+    best = None
+    for _ in range(REPEAT):
+        start = default_timer()
+        subprocess.check_call([sys.executable, '-c', script], env=env)
+        elapsed = default_timer() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    path = tempfile.mkdtemp()
+    try:
+        make_plugin(path)
+        print('%d stage modules, %.3fs import each, best of %d' % (
+            STAGES, IMPORT_TIME, REPEAT))
+        for name, script in (('eager', EAGER % STAGES), ('lazy', LAZY)):
+            print('%-6s %8.3fs' % (name, run(script, path)))
+    finally:
+        shutil.rmtree(path)
+
+
+if __name__ == '__main__':
+    main()
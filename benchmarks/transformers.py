@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+"""
+Compare the parsers of `processr.transformers`, called per value and
+on whole columns (`many`), with the lambdas they replace.
+
+    PYTHONPATH=. python benchmarks/transformers.py
+"""
+
+from datetime import datetime
+from timeit import default_timer
+
+from processr.transformers import (apply_default, parse_int, parse_float,
+                                   parse_bool, parse_datetime, strip, split)
+
+COUNT = 100000
+REPEAT = 5
+
+naive_default = apply_default(0)
+
+CASES = [
+    (
+        'int',
+        [str(i) if i % 10 else '' for i in range(COUNT)],
+        lambda v: int(naive_default(v)),
+        parse_int(default=0),
+    ),
+    (
+        'float',
+        [str(i / 7.0) for i in range(COUNT)],
+        lambda v: float(v) if v not in (None, '') else None,
+        parse_float(),
+    ),
+    (
+        'bool',
+        ['true', 'False', 'yes', 'no', '1', '0'] * (COUNT // 6),
+        lambda v: v.strip().lower() in ('true', 'yes', '1', 'y', 't', 'on'),
+        parse_bool(),
+    ),
+    (
+        'datetime',
+        ['2016-04-%02dT10:30:%02d' % (i % 28 + 1, i % 60)
+         for i in range(COUNT)],
+        lambda v: datetime.strptime(v, '%Y-%m-%dT%H:%M:%S'),
+        parse_datetime(),
+    ),
+    (
+        'strip',
+        ['  value %d  ' % i for i in range(COUNT)],
+        lambda v: v.strip() if v is not None else None,
+        strip(),
+    ),
+    (
+        'split',
+        ['a, b, c, %d' % i for i in range(COUNT)],
+        lambda v: [item.strip() for item in v.split(',') if item.strip()],
+        split(',', strip=True),
+    ),
+]
+
+
+def best(f):
+    timings = []
+    for _ in range(REPEAT):
+        start = default_timer()
+        f()
+        timings.append(default_timer() - start)
+    return min(timings)
+
+
+def main():
+    print('%d values, best of %d' % (COUNT, REPEAT))
+    print('%-10s %10s %10s %10s' % ('parser', 'lambda', 'per value', 'many'))
+    for name, values, naive, parser in CASES:
+        assert [parser(v) for v in values] == parser.many(values)
+        print('%-10s %9.3fs %9.3fs %9.3fs' % (
+            name,
+            best(lambda: [naive(v) for v in values]),
+            best(lambda: [parser(v) for v in values]),
+            best(lambda: parser.many(values)),
+        ))
+
+
+if __name__ == '__main__':
+    main()
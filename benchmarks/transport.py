@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+"""
+Compare the shared memory and the pickle transports of
+`parallel_process_many`, on narrow and wide records.
+
+    PYTHONPATH=. python benchmarks/transport.py
+"""
+
+import pickle
+from timeit import default_timer
+
+from processr.parallel import parallel_process_many
+from processr.transport import encode, decode
+
+
+def narrow_records(count):
+    return [
+        {'id': i, 'score': i / 3.0, 'status': 'ok', 'country': 'IT'}
+        for i in range(count)
+    ]
+
+
+def wide_records(count):
+    return [
+        dict(('metric_%d' % column, i * column / 7.0) for column in range(100))
+        for i in range(count)
+    ]
+
+
+PIPELINE = [
+    ('transform_values', {'id': str}),
+]
+
+
+def timed(f):
+    start = default_timer()
+    f()
+    return default_timer() - start
+
+
+def bench_serialization(name, records):
+    header, buffers = encode(records)
+    columnar = timed(lambda: decode(header + b''.join(buffers)))
+    columnar += timed(lambda: encode(records))
+    pickled = timed(
+        lambda: pickle.loads(pickle.dumps(records, pickle.HIGHEST_PROTOCOL)))
+    print('%-8s serialization  columnar: %.3fs  pickle: %.3fs' % (
+        name, columnar, pickled))
+
+
+def bench_parallel(name, records, chunk_size=1000):
+    for transport in ('auto', 'shared_memory', 'pickle'):
+        elapsed = timed(lambda: list(parallel_process_many(
+            records, PIPELINE, chunk_size=chunk_size, transport=transport)))
+        print('%-8s %-14s %.3fs' % (name, transport, elapsed))
+
+
+if __name__ == '__main__':
+    for name, records in (('narrow', narrow_records(200000)),
+                          ('wide', wide_records(20000))):
+        bench_serialization(name, records)
+        bench_parallel(name, records)
@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+
+import logging
+from timeit import default_timer
+
+from processr.compat import NullHandler
+
+log = logging.getLogger(__name__)
+log.addHandler(NullHandler())
+
+
+class AdaptivePredicates(object):
+    """
+    A predicate satisfied when all the given (independent) predicates
+    are, which learns the order to evaluate them on the live stream.
+    Predicates are periodically sorted by cost / rejection rate, so that
+    cheap and selective ones run first. Being a conjunction, its result
+    doesn't depend on the order: predicates must be side effect free and
+    safe to call on every value (e.g. not guarded by another predicate).
+
+    Use it wherever a predicate is expected, e.g. as the options of
+    a `filter_records` stage or as the `func` of `set_value`.
+
+    >>> is_the_answer = AdaptivePredicates([
+    ...     lambda d: d['the_answer'] % 2 == 0,
+    ...     lambda d: d['the_answer'] == 42])
+    >>> is_the_answer({'the_answer': 42}), is_the_answer({'the_answer': 54})
+    (True, False)
+
+    :param predicates: a list of predicates
+    :param sample_every: measure the predicates on one call
+        every `sample_every` ones
+    :param reorder_every: sort the predicates every `reorder_every` calls
+    :param frozen: never change the evaluation order
+    :param order: the initial evaluation order, as a list of indexes
+        of `predicates` (e.g. the `order` learned by a previous run)
+    """
+
+    def __init__(self, predicates, sample_every=16, reorder_every=1024,
+                 frozen=False, order=None):
+        self.predicates = list(predicates)
+        self.sample_every = sample_every
+        self.reorder_every = reorder_every
+        self.frozen = frozen
+        self.order = list(range(len(self.predicates))) \
+            if order is None else list(order)
+
+        self._ordered = [self.predicates[i] for i in self.order]
+        self._calls = 0
+        self._next_reorder = reorder_every
+        self._samples = [0] * len(self.predicates)
+        self._rejections = [0] * len(self.predicates)
+        self._elapsed = [0.0] * len(self.predicates)
+
+    def __call__(self, value):
+        if not self.frozen:
+            self._calls += 1
+            if self._calls >= self._next_reorder:
+                self._next_reorder += self.reorder_every
+                self.reorder()
+            if not self._calls % self.sample_every:
+                return self._sample(value)
+
+        for predicate in self._ordered:
+            if not predicate(value):
+                return False
+        return True
+
+    def _sample(self, value):
+        # Evaluate every predicate (no short-circuit), so that
+        # the rejection rate of each one is measured on every value.
+        result = True
+        for index, predicate in enumerate(self.predicates):
+            start = default_timer()
+            satisfied = predicate(value)
+            self._elapsed[index] += default_timer() - start
+            self._samples[index] += 1
+            if not satisfied:
+                self._rejections[index] += 1
+                result = False
+        return result
+
+    def _rank(self, index):
+        # Expected cost paid per rejected value: lower runs first.
+        if not self._rejections[index]:
+            return float('inf')
+        return self._elapsed[index] / self._rejections[index]
+
+    def reorder(self):
+        """
+        Sort the predicates according to the measures taken so far.
+        """
+        order = sorted(range(len(self.predicates)),
+                       key=lambda index: (self._rank(index), index))
+        if order != self.order:
+            log.debug({'predicates_order': order})
+            self.order = order
+            self._ordered = [self.predicates[i] for i in order]
+
+    def freeze(self):
+        """
+        Stop measuring and reordering, keeping the current order.
+        """
+        self.frozen = True
+
+    def stats(self):
+        """
+        Return the measured cost (seconds per call) and rejection
+        rate of each predicate, in the `predicates` order.
+        """
+        return [
+            {
+                'cost': elapsed / samples if samples else None,
+                'rejection_rate': rejections / samples if samples else None,
+            }
+            for samples, rejections, elapsed
+            in zip(self._samples, self._rejections, self._elapsed)
+        ]
@@ -0,0 +1,417 @@
+# -*- coding: utf-8 -*-
+
+import functools
+import logging
+import os
+import pickle
+import tempfile
+
+from processr.compat import NullHandler
+from processr.sketches import HyperLogLog, TDigest
+from processr.utils import as_tuple, record_key
+
+log = logging.getLogger(__name__)
+log.addHandler(NullHandler())
+
+
+##############################################################
+#                        Aggregators                         #
+##############################################################
+#
+# An aggregator summarizes the values of a field for a group
+# exposing `add(value)`, `merge(other)` and `result()`.
+
+class Count(object):
+
+    def __init__(self):
+        self.value = 0
+
+    def add(self, value):
+        self.value += 1
+
+    def merge(self, other):
+        self.value += other.value
+
+    def result(self):
+        return self.value
+
+
+class Sum(object):
+
+    def __init__(self):
+        self.value = 0
+
+    def add(self, value):
+        self.value += value
+
+    def merge(self, other):
+        self.value += other.value
+
+    def result(self):
+        return self.value
+
+
+class Min(object):
+
+    def __init__(self):
+        self.value = None
+
+    def add(self, value):
+        if self.value is None or value < self.value:
+            self.value = value
+
+    def merge(self, other):
+        if other.value is not None:
+            self.add(other.value)
+
+    def result(self):
+        return self.value
+
+
+class Max(object):
+
+    def __init__(self):
+        self.value = None
+
+    def add(self, value):
+        if self.value is None or value > self.value:
+            self.value = value
+
+    def merge(self, other):
+        if other.value is not None:
+            self.add(other.value)
+
+    def result(self):
+        return self.value
+
+
+class Mean(object):
+
+    def __init__(self):
+        self.total = 0
+        self.count = 0
+
+    def add(self, value):
+        self.total += value
+        self.count += 1
+
+    def merge(self, other):
+        self.total += other.total
+        self.count += other.count
+
+    def result(self):
+        return self.total / self.count if self.count else None
+
+
+class Distinct(object):
+    """
+    Approximate distinct count, see `processr.sketches.HyperLogLog`.
+    """
+
+    def __init__(self, precision=12):
+        self.sketch = HyperLogLog(precision)
+
+    def add(self, value):
+        self.sketch.add(value)
+
+    def merge(self, other):
+        self.sketch.merge(other.sketch)
+
+    def result(self):
+        return self.sketch.count()
+
+
+class Quantile(object):
+    """
+    Approximate quantile, see `processr.sketches.TDigest`.
+    """
+
+    def __init__(self, q, compression=100):
+        self.q = q
+        self.sketch = TDigest(compression)
+
+    def add(self, value):
+        self.sketch.add(value)
+
+    def merge(self, other):
+        self.sketch.merge(other.sketch)
+
+    def result(self):
+        return self.sketch.quantile(self.q)
+
+
+AGGREGATORS = {
+    'count': Count,
+    'sum': Sum,
+    'min': Min,
+    'max': Max,
+    'mean': Mean,
+    'distinct': Distinct,
+    'quantile': Quantile,
+}
+
+
+##############################################################
+#                        Group tables                        #
+##############################################################
+
+class GroupTable(object):
+    """
+    A group key -> aggregators mapping. When more than `max_groups`
+    groups are held in memory, their partial aggregators are spilled
+    to temporary files (partitioned by group key) and merged back
+    one partition at a time by `drain`.
+
+    :param new_aggregators: a function building the aggregators of a group
+    :param max_groups: the maximum number of groups held in memory
+    :param spill_dir: where spill files are created. Defaults
+        to the system temporary directory
+    """
+
+    partitions = 16
+
+    def __init__(self, new_aggregators, max_groups=None, spill_dir=None):
+        self.new_aggregators = new_aggregators
+        self.max_groups = max_groups
+        self.spill_dir = spill_dir
+        self.spills = 0
+        self._groups = {}
+        self._spill_paths = None
+
+    def __len__(self):
+        return len(self._groups)
+
+    def aggregators(self, key):
+        aggregators = self._groups.get(key)
+        if aggregators is None:
+            if self.max_groups is not None \
+                    and len(self._groups) >= self.max_groups:
+                self._spill()
+            aggregators = self._groups[key] = self.new_aggregators()
+        return aggregators
+
+    def _spill(self):
+        if self._spill_paths is None:
+            self._spill_paths = []
+            for _ in range(self.partitions):
+                fd, path = tempfile.mkstemp(
+                    prefix='processr-groups-', dir=self.spill_dir)
+                os.close(fd)
+                self._spill_paths.append(path)
+
+        spill_files = [open(path, 'ab') for path in self._spill_paths]
+        try:
+            for key, aggregators in self._groups.items():
+                # Spill files are read back by this process: the built-in
+                # hash is stable here, and equal keys (1, 1.0) share it
+                partition = hash(key) % self.partitions
+                pickle.dump((key, aggregators), spill_files[partition],
+                            pickle.HIGHEST_PROTOCOL)
+        finally:
+            for spill_file in spill_files:
+                spill_file.close()
+
+        log.debug({'spilled_groups': len(self._groups)})
+        self._groups = {}
+        self.spills += 1
+
+    def drain(self):
+        """
+        Lazily yield (key, aggregators) for every group, emptying the table.
+        """
+        if self._spill_paths is None:
+            groups, self._groups = self._groups, {}
+            for item in groups.items():
+                yield item
+            return
+
+        self._spill()
+        spill_paths, self._spill_paths = self._spill_paths, None
+        for path in spill_paths:
+            merged = {}
+            with open(path, 'rb') as spill_file:
+                for key, aggregators in _load_all(spill_file):
+                    current = merged.get(key)
+                    if current is None:
+                        merged[key] = aggregators
+                    else:
+                        for aggregator, other in zip(current, aggregators):
+                            aggregator.merge(other)
+            os.remove(path)
+            for item in merged.items():
+                yield item
+
+
+def _load_all(f):
+    while True:
+        try:
+            yield pickle.load(f)
+        except EOFError:
+            return
+
+
+##############################################################
+#                        Aggregation                         #
+##############################################################
+
+class Aggregation(object):
+    """
+    Group a stream of dictionaries and compute metrics for each group,
+    optionally over tumbling or sliding windows. Metrics are given as
+    a name -> (aggregator, field, *args) mapping; `None` values are
+    ignored, while ('count', None) counts the records of the group.
+
+    >>> aggregation = Aggregation(
+    ...     group_by='country',
+    ...     metrics={'orders': ('count', None), 'total': ('sum', 'amount')})
+    >>> list(aggregation.process_many([
+    ...     {'country': 'IT', 'amount': 40}, {'country': 'IT', 'amount': 2}]))
+    [{'country': 'IT', 'orders': 2, 'total': 42}]
+
+    Windows are built on the numeric `window_key` field, whose value
+    is expected to increase along the stream: a window is emitted
+    as soon as a record past its end is met, records belonging to
+    windows already emitted are dropped (and counted in `late`).
+    Every output of a windowed aggregation has `window_start` and
+    `window_end` items.
+
+    :param group_by: the field (or the fields) to group by
+    :param metrics: a name -> (aggregator, field, *args) mapping.
+        See `AGGREGATORS` for the available aggregators
+    :param window_key: the field holding the record timestamp
+    :param window_size: the size of the windows
+    :param window_slide: the distance between the start of two
+        sliding windows. Defaults to `window_size` (tumbling windows)
+    :param max_groups: the maximum number of groups held in memory
+        for each window; further groups are spilled to disk
+    :param spill_dir: where spill files are created
+    """
+
+    def __init__(self, group_by=(), metrics=None, window_key=None,
+                 window_size=None, window_slide=None, max_groups=None,
+                 spill_dir=None):
+        self.group_by = as_tuple(group_by) if group_by else ()
+        self.window_key = window_key
+        self.window_size = window_size
+        self.window_slide = window_slide or window_size
+        self.max_groups = max_groups
+        self.spill_dir = spill_dir
+        self.late = 0
+
+        metrics = metrics or {}
+        self._names = list(metrics)
+        self._fields = [metrics[name][1] for name in self._names]
+        self._factories = [
+            functools.partial(AGGREGATORS[metrics[name][0]],
+                              *metrics[name][2:])
+            for name in self._names
+        ]
+        self._tables = {}
+        self._watermark = None
+        self._closed = float('-inf')
+
+    @property
+    def output_keys(self):
+        """
+        The keys of the dictionaries produced by the aggregation.
+        """
+        window_keys = ['window_start', 'window_end'] \
+            if self.window_key is not None else []
+        return list(self.group_by) + window_keys + self._names
+
+    def _new_aggregators(self):
+        return [factory() for factory in self._factories]
+
+    def _table(self, window_start):
+        table = self._tables.get(window_start)
+        if table is None:
+            table = self._tables[window_start] = GroupTable(
+                self._new_aggregators, self.max_groups, self.spill_dir)
+        return table
+
+    def _window_starts(self, timestamp):
+        start = timestamp - timestamp % self.window_slide
+        while start > timestamp - self.window_size:
+            yield start
+            start -= self.window_slide
+
+    def add(self, d):
+        """
+        Add a dictionary to the aggregation.
+        """
+        if self.window_key is None:
+            self._update(self._table(None), d)
+            return
+
+        timestamp = d[self.window_key]
+        if self._watermark is None or timestamp > self._watermark:
+            self._watermark = timestamp
+        for window_start in self._window_starts(timestamp):
+            if window_start + self.window_size <= self._closed:
+                self.late += 1
+                log.debug({'late_record': d, 'window_start': window_start})
+                continue
+            self._update(self._table(window_start), d)
+
+    def _update(self, table, d):
+        aggregators = table.aggregators(record_key(d, self.group_by))
+        for aggregator, field in zip(aggregators, self._fields):
+            if field is None:
+                aggregator.add(d)
+            else:
+                value = d.get(field)
+                if value is not None:
+                    aggregator.add(value)
+
+    def _output(self, window_start, key, aggregators):
+        output = dict(zip(self.group_by, key))
+        if window_start is not None:
+            output['window_start'] = window_start
+            output['window_end'] = window_start + self.window_size
+        output.update(
+            (name, aggregator.result())
+            for name, aggregator in zip(self._names, aggregators)
+        )
+        return output
+
+    def _emit(self, window_starts):
+        for window_start in sorted(window_starts):
+            table = self._tables.pop(window_start)
+            for key, aggregators in table.drain():
+                yield self._output(window_start, key, aggregators)
+
+    def emit_closed(self):
+        """
+        Lazily yield the results of the windows ended before
+        the greatest timestamp seen so far.
+        """
+        if self._watermark is None:
+            return iter(())
+        self._closed = self._watermark
+        closed = [
+            start for start in self._tables
+            if start + self.window_size <= self._watermark
+        ]
+        return self._emit(closed)
+
+    def flush(self):
+        """
+        Lazily yield the results of all the groups (of all the windows).
+        """
+        if self.window_key is None:
+            return self._emit([None]) if None in self._tables else iter(())
+        return self._emit(list(self._tables))
+
+    def process_many(self, ds):
+        """
+        Aggregate an iterable of dictionaries, lazily yielding
+        the results as soon as they're available.
+        """
+        for d in ds:
+            self.add(d)
+            if self.window_key is not None \
+                    and self._watermark == d[self.window_key]:
+                for output in self.emit_closed():
+                    yield output
+        for output in self.flush():
+            yield output
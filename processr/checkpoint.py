@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+
+import logging
+import os
+from itertools import islice
+
+from processr.compat import abc, NullHandler
+from processr.processr import process, StageDefinitions, DROPPED
+from processr.utils import atomic_dump, load_dump
+
+log = logging.getLogger(__name__)
+log.addHandler(NullHandler())
+
+
+def _get_state(obj):
+    if hasattr(obj, '__setstate__') and hasattr(obj, '__getstate__'):
+        return obj.__getstate__()
+    return obj.__dict__
+
+
+def _set_state(obj, state):
+    if hasattr(obj, '__setstate__'):
+        obj.__setstate__(state)
+    else:
+        obj.__dict__.update(state)
+
+
+class Checkpoint(object):
+    """
+    The progress of a job, atomically persisted to a local file:
+        - offset: the number of source dictionaries processed;
+        - watermark: the number of outputs produced;
+        - state: the state of the stateful objects used by the pipeline
+          (e.g. caches, duplicate filters, aggregations), given as a
+          name -> object mapping. Objects are restored in place,
+          so the pipeline can keep referencing them.
+
+    :param path: the path of the checkpoint file
+    :param state: a name -> stateful object mapping
+    :param every: how many source dictionaries are processed
+        between two checkpoints
+    """
+
+    def __init__(self, path, state=None, every=10000):
+        self.path = path
+        self.state = state or {}
+        self.every = every
+        self.offset = 0
+        self.watermark = 0
+
+    def save(self):
+        atomic_dump({
+            'offset': self.offset,
+            'watermark': self.watermark,
+            'state': dict(
+                (name, _get_state(obj)) for name, obj in self.state.items()
+            ),
+        }, self.path)
+        log.debug({'checkpoint': self.path, 'offset': self.offset})
+
+    def restore(self):
+        """
+        Load the last checkpoint, if any. Return True if found.
+        """
+        if not os.path.exists(self.path):
+            return False
+        checkpoint = load_dump(self.path)
+        self.offset = checkpoint['offset']
+        self.watermark = checkpoint['watermark']
+        for name, state in checkpoint['state'].items():
+            _set_state(self.state[name], state)
+        log.debug({'restored_checkpoint': self.path, 'offset': self.offset})
+        return True
+
+    def clear(self):
+        """
+        Delete the checkpoint file, e.g. once the job is completed.
+        """
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def checkpointed_process(source, pipeline, checkpoint,
+                         stage_definitions=StageDefinitions(), commit=None):
+    """
+    Lazily process the dictionaries of `source` one at a time (with
+    `process`), saving `checkpoint` every `checkpoint.every` of them.
+    If a checkpoint exists, the job resumes from it: the dictionaries
+    already processed are skipped and the stateful objects restored.
+
+    A checkpoint is taken only when the consumer asks for the next
+    output, i.e. after it has handled all the previous ones. Outputs
+    handled after the last checkpoint are produced again on resume:
+    to avoid duplicates, the consumer should make its outputs durable
+    in `commit(watermark)`, which is called before each checkpoint
+    (and at the end of the source) with the number of outputs so far.
+
+    :param source: an iterable of dictionaries, or a function called
+        with the offset to resume from, returning the iterable of the
+        remaining dictionaries (e.g. seeking a file)
+    :param pipeline: the processing pipeline
+    :param checkpoint: a `Checkpoint`
+    :param stage_definitions: a (stage_name, stage_handler) mapping
+    :param commit: an optional function called with the watermark
+        before each checkpoint
+    :return: an iterator of dictionaries
+    """
+    checkpoint.restore()
+    if isinstance(source, abc.Callable):
+        ds = iter(source(checkpoint.offset))
+    else:
+        ds = islice(source, checkpoint.offset, None)
+
+    def save():
+        if commit is not None:
+            commit(checkpoint.watermark)
+        checkpoint.save()
+
+    for d in ds:
+        output = process(d, pipeline, stage_definitions)
+        checkpoint.offset += 1
+        if output is not DROPPED:
+            checkpoint.watermark += 1
+            yield output
+        if not checkpoint.offset % checkpoint.every:
+            save()
+    if checkpoint.offset % checkpoint.every:
+        save()
@@ -1,21 +1,21 @@
 # -*- coding: utf-8 -*-
 
-try:
-    from functools import reduce
-except ImportError:
-    reduce = reduce
+import collections.abc as abc
+from functools import reduce
+from importlib import metadata as _metadata
+from logging import NullHandler
 
-try:
-    import collections.abc as abc
-except ImportError:
-    import collections as abc
 
-import logging
-try:
-    from logging import NullHandler
-except ImportError:
-    class NullHandler(logging.Handler):
-        def emit(self, record):
-            pass
+def entry_points(group):
+    """
+    Return the entry points (objects with `name` and `load()`) of the
+    installed distributions in `group`, without loading them.
+    """
+    found = _metadata.entry_points()
+    if hasattr(found, 'select'):
+        return list(found.select(group=group))
+    # Python < 3.10
+    return list(found.get(group, ()))
 
-__all__ = ['reduce', 'abc', 'NullHandler']
+
+__all__ = ['reduce', 'abc', 'NullHandler', 'entry_points']
@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+
+import math
+
+from processr.sketches import fingerprint
+from processr.utils import LRUCache, atomic_dump, load_dump
+
+
+##############################################################
+#                    Duplicate filters                       #
+##############################################################
+#
+# A duplicate filter remembers the keys it has seen. `check(key)`
+# returns True (and counts a dropped record) if `key` was already
+# seen, otherwise it records `key` and returns False.
+# Filters can be saved to disk and loaded back between runs.
+
+class _DuplicateFilter(object):
+
+    def save(self, path):
+        """
+        Atomically save the filter state to `path`.
+        """
+        atomic_dump(self, path)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Load a filter saved with `save`.
+        """
+        duplicate_filter = load_dump(path)
+        if not isinstance(duplicate_filter, cls):
+            raise TypeError('%s does not contain a %s' % (path, cls.__name__))
+        return duplicate_filter
+
+
+class ExactFilter(_DuplicateFilter):
+    """
+    Remember the last `maxsize` keys seen. No false positives, but
+    a duplicate is missed if more than `maxsize` distinct keys are
+    met after the original record.
+
+    >>> duplicate_filter = ExactFilter()
+    >>> duplicate_filter.check(('the_answer', 42))
+    False
+    >>> duplicate_filter.check(('the_answer', 42))
+    True
+
+    :param maxsize: the number of keys to remember
+    """
+
+    def __init__(self, maxsize=1000000):
+        self.checked = 0
+        self.dropped = 0
+        self._seen = LRUCache(maxsize)
+
+    def check(self, key):
+        self.checked += 1
+        if self._seen.get(key) is not None:
+            self.dropped += 1
+            return True
+        self._seen[key] = True
+        return False
+
+
+class BloomFilter(_DuplicateFilter):
+    """
+    Remember the keys seen using a fixed amount of memory, sized
+    to hold `capacity` keys with the given false positive rate
+    (i.e. the rate of unique records wrongly dropped).
+    About 1.2 bytes per key are needed for a 1% rate.
+
+    :param capacity: the expected number of distinct keys
+    :param error_rate: the false positive rate at full capacity
+    """
+
+    def __init__(self, capacity=1000000, error_rate=0.01):
+        self.checked = 0
+        self.dropped = 0
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.size = int(math.ceil(
+            -capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, int(round(self.size / capacity * math.log(2))))
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, key):
+        # Kirsch-Mitzenmacher double hashing: two hashes are enough
+        # to build all the `hashes` positions.
+        h = fingerprint(key)
+        h1, h2 = h & 0xFFFFFFFF, h >> 32
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def check(self, key):
+        self.checked += 1
+        bits = self._bits
+        positions = self._positions(key)
+        if all(bits[p >> 3] & (1 << (p & 7)) for p in positions):
+            self.dropped += 1
+            return True
+        for p in positions:
+            bits[p >> 3] |= 1 << (p & 7)
+        return False
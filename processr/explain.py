@@ -0,0 +1,336 @@
+# -*- coding: utf-8 -*-
+
+import copy
+import sys
+from collections import OrderedDict
+from timeit import default_timer
+
+from processr.compat import abc
+from processr import processr as stages
+from processr.processr import (process_many, StageDefinitions,
+                               InvalidTransformerFormat)
+from processr.profiling import instrument_stage, MemoryProfile
+
+
+##############################################################
+#                    Static pipeline analysis                #
+##############################################################
+
+def _name(f):
+    module = getattr(f, '__module__', None)
+    name = getattr(f, '__qualname__', getattr(f, '__name__', repr(f)))
+    return '%s.%s' % (module, name) if module else name
+
+
+def normalize(fs):
+    """
+    Return the flat list of the transformers applied by the spec `fs`
+    (see `process_value`), as strings. Raise `InvalidTransformerFormat`
+    like `process_value` would.
+
+    >>> normalize([(round, {'ndigits': 2}), [abs, str]])
+    ['builtins.round(ndigits=2)', 'builtins.abs', 'builtins.str']
+    """
+    if isinstance(fs, tuple):
+        f, kwargs = fs
+        return ['%s(%s)' % (_name(f), ', '.join(
+            '%s=%r' % item for item in sorted(kwargs.items())))]
+    elif isinstance(fs, abc.Iterable):
+        return [name for f in fs for name in normalize(f)]
+    elif isinstance(fs, abc.Callable):
+        return [_name(fs)]
+    raise InvalidTransformerFormat(fs)
+
+
+# handler -> function(keys, stage_opts) returning the output keys
+# (or None, if they can't be known) and the dict copies made per record.
+def _same_keys(copies):
+    return lambda keys, stage_opts: (keys, copies)
+
+
+def _rename_keys_flow(keys, stage_opts):
+    if keys is None:
+        return None, 1
+    return [stage_opts.get(k, k) for k in keys], 1
+
+
+def _enrich_flow(keys, stage_opts):
+    fields = stage_opts.get('fields')
+    if keys is None or fields is None:
+        return None, 1
+    return keys + [f for f in fields if f not in keys], 1
+
+
+KEY_FLOWS = {
+    stages.rename_keys: _rename_keys_flow,
+    stages.project_dict: lambda keys, stage_opts: (list(stage_opts), 1),
+    stages.transform_values: _same_keys(1),
+    stages.transform_values_strict: _same_keys(1),
+    stages.transform_dict: lambda keys, stage_opts: (None, None),
+    stages.enrich: _enrich_flow,
+    stages.filter_records: _same_keys(0),
+    stages.dedupe: _same_keys(0),
+    stages.intern_values: _same_keys(1),
+    stages.sort_by: _same_keys(0),
+    stages.top_k: _same_keys(0),
+    stages.aggregate: lambda keys, stage_opts: (stage_opts.output_keys, 0),
+}
+
+
+def _transformers(handler, stage_opts):
+    if handler in (stages.transform_values, stages.transform_values_strict):
+        return [(key, normalize(fs)) for key, fs in stage_opts.items()]
+    elif handler is stages.transform_dict:
+        return [(None, normalize(stage_opts))]
+    return []
+
+
+def _mode(handler):
+    if hasattr(handler, 'process_many'):
+        return 'batch'
+    elif hasattr(handler, 'plan'):
+        return 'shape plan'
+    return 'per record'
+
+
+def plan(pipeline, stage_definitions=StageDefinitions(), keys=None):
+    """
+    Resolve a pipeline, returning a list with a dictionary for each stage:
+        - stage: the stage name;
+        - handler: the qualified name of the stage handler;
+        - mode: how `process_many` runs it ('batch', 'shape plan'
+          or 'per record');
+        - transformers: a list of (key, normalized transformers);
+        - keys: the keys of its output, or None if unknown;
+        - copies: the dict copies made per record, or None if unknown.
+    Raise KeyError for unknown stages.
+
+    :param pipeline: the processing pipeline
+    :param stage_definitions: a (stage_name, stage_handler) mapping
+    :param keys: the keys of the input dictionaries, if known
+    """
+    keys = list(keys) if keys is not None else None
+    resolved = []
+    for stage_name, stage_option in pipeline:
+        handler = stage_definitions[stage_name]
+        flow = KEY_FLOWS.get(handler)
+        keys, copies = flow(keys, stage_option) if flow else (None, None)
+        resolved.append({
+            'stage': stage_name,
+            'handler': _name(handler),
+            'mode': _mode(handler),
+            'transformers': _transformers(handler, stage_option),
+            'keys': keys,
+            'copies': copies,
+        })
+    return resolved
+
+
+def _print_plan(resolved, keys, file, annotations=None):
+    print('input keys: %s' % (sorted(keys) if keys is not None else '?'),
+          file=file)
+    for position, stage in enumerate(resolved):
+        print('%d %s -> %s [%s]' % (
+            position, stage['stage'], stage['handler'], stage['mode']),
+            file=file)
+        if annotations is not None:
+            print('    %s' % annotations[position]['summary'], file=file)
+        for key, transformers in stage['transformers']:
+            prefix = '[%r] ' % key if key is not None else ''
+            line = '    %s%s' % (prefix, ' | '.join(transformers))
+            if annotations is not None:
+                line += '  (%s)' % annotations[position]['transformers'].get(
+                    key, '')
+            print(line, file=file)
+        print('    keys: %s, dict copies: %s' % (
+            sorted(stage['keys']) if stage['keys'] is not None else '?',
+            stage['copies'] if stage['copies'] is not None else '?'),
+            file=file)
+
+    known = [stage['copies'] for stage in resolved]
+    print('dict copies per record: %d%s' % (
+        sum(c for c in known if c is not None),
+        ' (+ unknown)' if None in known else ''), file=file)
+
+
+def explain(pipeline, stage_definitions=StageDefinitions(), keys=None,
+            file=None):
+    """
+    Print the resolved plan of a pipeline: the handler of each stage,
+    its normalized transformers, the expected keys and dict copies.
+
+    >>> explain([('rename_keys', {'a': 'b'}),
+    ...          ('transform_values', {'b': str})], keys=['a'])
+    input keys: ['a']
+    0 rename_keys -> processr.processr.rename_keys [shape plan]
+        keys: ['b'], dict copies: 1
+    1 transform_values -> processr.processr.transform_values [shape plan]
+        ['b'] builtins.str
+        keys: ['b'], dict copies: 1
+    dict copies per record: 2
+
+    :param pipeline: the processing pipeline
+    :param stage_definitions: a (stage_name, stage_handler) mapping
+    :param keys: the keys of the input dictionaries, if known
+    :param file: where to print. Defaults to the standard output
+    """
+    file = file or sys.stdout
+    _print_plan(plan(pipeline, stage_definitions, keys), keys, file)
+
+
+##############################################################
+#                   Measured pipeline analysis               #
+##############################################################
+
+class _Timing(object):
+
+    def __init__(self):
+        self.calls = 0
+        self.seconds = 0.0
+
+
+def _copy(stage_option):
+    try:
+        return copy.deepcopy(stage_option), True
+    except Exception:
+        return stage_option, False
+
+
+def _timed_run(records, stage_name, stage_option, handler,
+               stage_definitions):
+    timings = OrderedDict()
+
+    def wrap(f, label):
+        timing = timings.setdefault(label, _Timing())
+
+        def timed(value, *args, **kwargs):
+            start = default_timer()
+            output = f(value, *args, **kwargs)
+            timing.seconds += default_timer() - start
+            timing.calls += 1
+            return output
+        return timed
+
+    instrumented = instrument_stage(handler, stage_option, wrap, '')
+    start = default_timer()
+    outputs = list(process_many(
+        records, [(stage_name, instrumented)], stage_definitions))
+    return outputs, default_timer() - start, timings
+
+
+def _profiled_run(records, stage_name, stage_option, stage_definitions):
+    profile = MemoryProfile(batch_size=max(len(records), 1))
+    for _ in profile.process_many(
+            records, [(stage_name, stage_option)], stage_definitions):
+        pass
+    return profile
+
+
+def analyze(pipeline, sample_records, stage_definitions=StageDefinitions(),
+            file=None):
+    """
+    Run a pipeline on a sample of dictionaries, one stage at a time, and
+    print its plan annotated with the measures of each stage and of each
+    transformer: time, memory (the peak reached while running a stage
+    on the sample and the bytes it retains, or the bytes allocated by
+    each call of a transformer, see `processr.profiling`) and the
+    selectivity of stages, i.e. the ratio of output to input records.
+    Return the list of the measures of the stages.
+
+    Every stage runs twice, with and without tracing memory allocations,
+    on deep copies of its options: the state of the options (e.g. the
+    filter of `dedupe`, or an `Aggregation`) isn't changed by the
+    analysis. Options which can't be copied (e.g. holding a database
+    connection) are used as they are, and changed, while their memory
+    isn't measured: the output marks them as 'not copied'. Transformers
+    (e.g. closures) are never copied: the ones keeping a state see
+    the sample twice.
+
+    :param pipeline: the processing pipeline
+    :param sample_records: a list of dictionaries
+    :param stage_definitions: a (stage_name, stage_handler) mapping
+    :param file: where to print. Defaults to the standard output
+    """
+    file = file or sys.stdout
+    records = list(sample_records)
+    keys = sorted(set(k for d in records for k in d)) if records else None
+    resolved = plan(pipeline, stage_definitions, keys)
+
+    measures = []
+    annotations = []
+    for stage_name, stage_option in pipeline:
+        handler = stage_definitions[stage_name]
+        timed_option, copied = _copy(stage_option)
+        outputs, seconds, timings = _timed_run(
+            records, stage_name, timed_option, handler, stage_definitions)
+
+        profile = None
+        if copied:
+            profile = _profiled_run(records, stage_name,
+                                    _copy(stage_option)[0], stage_definitions)
+        label = '0 %s' % stage_name
+
+        transformers = OrderedDict()
+        for transformer, timing in timings.items():
+            allocations = profile.transformers.get(label + transformer) \
+                if profile is not None else None
+            transformers[transformer] = {
+                'calls': timing.calls,
+                'seconds': timing.seconds,
+                'allocated_bytes':
+                    allocations.allocated if allocations else None,
+                'retained_bytes':
+                    allocations.retained if allocations else None,
+            }
+
+        measure = {
+            'stage': stage_name,
+            'copied': copied,
+            'records_in': len(records),
+            'records_out': len(outputs),
+            'selectivity':
+                len(outputs) / len(records) if records else None,
+            'seconds': seconds,
+            'peak_bytes': max(profile.batch_peaks or [0])
+            if profile is not None else None,
+            'retained_bytes': profile.stages[label].retained
+            if profile is not None else None,
+            'transformers': transformers,
+        }
+        measures.append(measure)
+
+        if copied:
+            memory = 'peak %d B, retained %d B' % (
+                measure['peak_bytes'], measure['retained_bytes'])
+        else:
+            memory = 'not copied'
+        annotations.append({
+            'summary': '%d -> %d records (%.0f%%), %.6fs, %s' % (
+                len(records), len(outputs),
+                100 * (measure['selectivity'] or 0), seconds, memory),
+            'transformers': _by_key(handler, stage_option, transformers),
+        })
+        records = outputs
+
+    _print_plan(resolved, keys, file, annotations)
+    return measures
+
+
+def _by_key(handler, stage_option, transformers):
+    # Sum the measures of the transformers of each key
+    by_key = {}
+    keys = list(stage_option) if handler in (
+        stages.transform_values, stages.transform_values_strict) else [None]
+    for key in keys:
+        prefix = '[%r]' % (key, ) if key is not None else ''
+        selected = [t for label, t in transformers.items()
+                    if label.startswith(prefix + ' ')
+                    or label.startswith(prefix + '/')]
+        summary = '%d calls, %.6fs' % (
+            max([t['calls'] for t in selected] or [0]),
+            sum(t['seconds'] for t in selected))
+        allocated = [t['allocated_bytes'] for t in selected]
+        if None not in allocated:
+            summary += ', %d B allocated' % sum(allocated)
+        by_key[key] = summary
+    return by_key
@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+
+import sys
+
+from processr.utils import LRUCache, _MISSING
+
+
+class InternPool(object):
+    """
+    A bounded pool of canonical objects. `intern` returns the pooled
+    object equal to the given one, so that the records retaining
+    the same key or low cardinality value share a single object.
+    Values are pooled by (type, value): 1, 1.0 and True are kept apart.
+
+    >>> pool = InternPool()
+    >>> status = pool.intern(''.join(['o', 'k']))
+    >>> pool.intern(''.join(['o', 'k'])) is status
+    True
+
+    :param maxsize: the maximum number of pooled objects; the least
+        recently used ones are evicted first
+    """
+
+    def __init__(self, maxsize=65536):
+        self.interned = 0
+        self.saved_bytes = 0
+        self._pool = LRUCache(maxsize)
+
+    def __len__(self):
+        return len(self._pool)
+
+    def intern(self, value):
+        """
+        Return the canonical object equal to `value`.
+        Unhashable values are returned untouched.
+        """
+        key = (type(value), value)
+        try:
+            canonical = self._pool.get(key, _MISSING)
+        except TypeError:
+            return value
+
+        if canonical is _MISSING:
+            self._pool[key] = value
+            return value
+        if canonical is not value:
+            # `value` can now be garbage collected
+            self.interned += 1
+            self.saved_bytes += sys.getsizeof(value)
+        return canonical
@@ -0,0 +1,199 @@
+# -*- coding: utf-8 -*-
+
+import sqlite3
+from bisect import bisect_left, bisect_right
+from itertools import chain
+from operator import itemgetter
+
+from processr.utils import (as_tuple, record_key, quote_identifier as _quote,
+                            LRUCache, _MISSING)
+
+
+##############################################################
+#                   Lookup table indexes                     #
+##############################################################
+#
+# An index maps a key (a tuple of values) to a reference record.
+# Every index exposes:
+#   - `keys`: the names of the fields the index is keyed on;
+#   - `get(key)`: the matching record, or None;
+#   - `get_many(keys)`: a {key: record} dict of the matching records.
+
+
+class HashIndex(object):
+    """
+    An in-memory hash index.
+
+    >>> index = HashIndex([{'code': 'IT', 'name': 'Italy'}], 'code')
+    >>> index.get(('IT', ))
+    {'code': 'IT', 'name': 'Italy'}
+
+    :param records: an iterable of reference dictionaries
+    :param keys: the field (or the fields) the index is keyed on
+    """
+
+    def __init__(self, records, keys):
+        self.keys = as_tuple(keys)
+        self._table = dict(
+            (record_key(record, self.keys), record) for record in records
+        )
+
+    def get(self, key):
+        return self._table.get(key)
+
+    def get_many(self, keys):
+        table = self._table
+        return dict((key, table[key]) for key in keys if key in table)
+
+
+class SortedIndex(object):
+    """
+    An index backed by a sorted array, which supports range lookups.
+    When `floor` is True, `get` returns the record with the greatest
+    key lower or equal to the requested one (useful to join on ranges,
+    e.g. validity dates or IP ranges).
+
+    >>> index = SortedIndex([{'from': 0}, {'from': 10}], 'from', floor=True)
+    >>> index.get((7, ))
+    {'from': 0}
+
+    :param records: an iterable of reference dictionaries
+    :param keys: the field (or the fields) the index is keyed on
+    :param floor: match the closest lower key instead of the exact one
+    """
+
+    def __init__(self, records, keys, floor=False):
+        self.keys = as_tuple(keys)
+        self.floor = floor
+        rows = sorted(
+            ((record_key(record, self.keys), record) for record in records),
+            key=itemgetter(0)
+        )
+        self._keys = [key for key, _ in rows]
+        self._records = [record for _, record in rows]
+
+    def get(self, key):
+        if self.floor:
+            position = bisect_right(self._keys, key) - 1
+            return self._records[position] if position >= 0 else None
+
+        position = bisect_left(self._keys, key)
+        if position < len(self._keys) and self._keys[position] == key:
+            return self._records[position]
+        return None
+
+    def get_many(self, keys):
+        matches = ((key, self.get(key)) for key in keys)
+        return dict(
+            (key, record) for key, record in matches if record is not None
+        )
+
+    def range(self, low, high):
+        """
+        Return the records whose key is in the [low, high) interval.
+        """
+        start = bisect_left(self._keys, low)
+        stop = bisect_left(self._keys, high)
+        return self._records[start:stop]
+
+
+class SQLiteIndex(object):
+    """
+    An index backed by a table of a local SQLite database, fronted
+    by an LRU cache (which caches misses, too).
+    `get_many` resolves all the keys not found in the cache
+    with a single query.
+
+    :param path: the path of the SQLite database
+    :param table: the name of the table holding the reference records
+    :param keys: the column (or the columns) the index is keyed on
+    :param cache_size: the number of keys kept in the LRU cache
+    """
+
+    # Keep well below SQLITE_MAX_VARIABLE_NUMBER (999 on old releases).
+    max_variables = 900
+
+    def __init__(self, path, table, keys, cache_size=1024):
+        self.keys = as_tuple(keys)
+        self.table = table
+        self.cache = LRUCache(cache_size)
+        self._connection = sqlite3.connect(path)
+        self._connection.row_factory = sqlite3.Row
+
+    @classmethod
+    def build(cls, path, table, records, keys, **kwargs):
+        """
+        Create (or replace) `table` in the database at `path`, filling
+        it with `records`, and return an index on it. Columns are taken
+        from the keys of the first record.
+        """
+        keys = as_tuple(keys)
+        records = iter(records)
+        first = next(records)
+        columns = list(first)
+
+        connection = sqlite3.connect(path)
+        with connection:
+            connection.execute('DROP TABLE IF EXISTS %s' % _quote(table))
+            connection.execute('CREATE TABLE %s (%s)' % (
+                _quote(table), ', '.join(_quote(c) for c in columns)
+            ))
+            connection.execute('CREATE INDEX %s ON %s (%s)' % (
+                _quote('%s_lookup' % table),
+                _quote(table),
+                ', '.join(_quote(k) for k in keys)
+            ))
+            connection.executemany(
+                'INSERT INTO %s VALUES (%s)' % (
+                    _quote(table), ', '.join('?' for _ in columns)
+                ),
+                ([record[c] for c in columns] for record in
+                 chain([first], records))
+            )
+        connection.close()
+        return cls(path, table, keys, **kwargs)
+
+    def get(self, key):
+        return self.get_many([key]).get(key)
+
+    def get_many(self, keys):
+        found = {}
+        missing = []
+        for key in keys:
+            record = self.cache.get(key, _MISSING)
+            if record is _MISSING:
+                missing.append(key)
+            elif record is not None:
+                found[key] = record
+
+        batch_size = self.max_variables // len(self.keys)
+        for start in range(0, len(missing), batch_size):
+            batch = missing[start:start + batch_size]
+            records = self._query(batch)
+            for key in batch:
+                record = records.get(key)
+                self.cache[key] = record
+                if record is not None:
+                    found[key] = record
+        return found
+
+    def _query(self, keys):
+        if len(self.keys) == 1:
+            condition = '%s IN (%s)' % (
+                _quote(self.keys[0]), ', '.join('?' for _ in keys)
+            )
+        else:
+            # Row values require SQLite >= 3.15
+            row = '(%s)' % ', '.join('?' for _ in self.keys)
+            condition = '(%s) IN (VALUES %s)' % (
+                ', '.join(_quote(k) for k in self.keys),
+                ', '.join(row for _ in keys)
+            )
+        query = 'SELECT * FROM %s WHERE %s' % (_quote(self.table), condition)
+        parameters = [value for key in keys for value in key]
+
+        rows = self._connection.execute(query, parameters)
+        return dict((record_key(row, self.keys), dict(row)) for row in rows)
+
+    def close(self):
+        self._connection.close()
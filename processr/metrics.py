@@ -0,0 +1,488 @@
+# -*- coding: utf-8 -*-
+
+import threading
+from bisect import bisect_left
+from collections import OrderedDict
+from functools import partial
+from timeit import default_timer
+
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+from processr.processr import DROPPED, ShapeCache
+
+
+##############################################################
+#                       Runtime metrics                      #
+##############################################################
+
+# Upper bounds of the latency histogram buckets, in seconds
+DEFAULT_BUCKETS = (
+    0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005,
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0,
+)
+
+
+class _Histogram(object):
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        # The last bucket counts the values above the greatest bound
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def merge(self, other):
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        self.count += other.count
+        self.sum += other.sum
+
+    def snapshot(self):
+        cumulative = []
+        total = 0
+        for bound, count in zip(self.buckets + (float('inf'), ),
+                                self.counts):
+            total += count
+            cumulative.append((bound, total))
+        return {
+            'count': self.count,
+            'sum': self.sum,
+            'mean': self.sum / self.count if self.count else None,
+            'buckets': cumulative,
+        }
+
+
+class _ThreadMetrics(object):
+    """
+    The counters of a thread. Only their thread writes them,
+    so they're updated without locks.
+    """
+
+    def __init__(self, size, buckets):
+        self.size = size
+        # Records processed one at a time (`process`)
+        self.records = 0
+        self.dropped = [0] * size
+        self.errors = [0] * size
+        # Records processed as a stream (`process_many`): the outputs
+        # of batch stages, the records dropped by the other ones
+        self.batch_records = 0
+        self.outputs = [0] * size
+        self.batch_dropped = [0] * size
+        self.batch_errors = [0] * size
+        self.last_error = None
+
+        self.latency = _Histogram(buckets)
+        self.stage_latency = [_Histogram(buckets) for _ in range(size)]
+
+
+class Metrics(object):
+    """
+    Count the records processed by a pipeline, the ones each stage drops
+    and the exceptions it raises, and sample their latency, while
+    dictionaries are processed. Pass it as the `metrics` argument of
+    `process` or `process_many` for a given pipeline, then pull its
+    `snapshot()` (or export it, see `prometheus_text` and `serve`)
+    from any thread.
+
+    Every thread updates its own counters, without locks: snapshots
+    add them up. Latency is measured on one record every
+    1 / `sample_rate`, so histogram counts are a sample of the records.
+    With `process_many`, batch stages (e.g. `aggregate`) are lazy, so
+    their latency is the time it takes to pull one of their outputs,
+    upstream stages included; the latency of the pipeline is the one
+    of its last stage, or of the stages following the last batch stage.
+
+    :param name: the name of the pipeline, used as the metrics label
+    :param sample_rate: the fraction of the records whose latency
+        is measured, or 0 to disable latency measures
+    :param buckets: the upper bounds of the latency histogram buckets
+    """
+
+    def __init__(self, name='pipeline', sample_rate=0.01,
+                 buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.sample_rate = sample_rate
+        self.sample_every = int(round(1 / sample_rate)) if sample_rate else 0
+        self.buckets = tuple(buckets)
+        self.stages = None
+        # The positions of the batch stages, when processing streams
+        self.batch_positions = frozenset()
+        self.started = default_timer()
+        self._local = threading.local()
+        self._threads = []
+        self._lock = threading.Lock()
+
+    def _store(self, pipeline):
+        try:
+            store = self._local.store
+        except AttributeError:
+            store = self._new_store(pipeline)
+        if len(pipeline) != store.size:
+            raise ValueError('a Metrics instance tracks a single pipeline')
+        return store
+
+    def _new_store(self, pipeline):
+        # First record of this thread: the only locked path
+        with self._lock:
+            if self.stages is None:
+                self.stages = [
+                    '%d %s' % (position, stage_name)
+                    for position, (stage_name, _) in enumerate(pipeline)
+                ]
+            store = self._local.store = _ThreadMetrics(
+                len(self.stages), self.buckets)
+            self._threads.append(store)
+        return store
+
+    def process(self, d, pipeline, stage_definitions, shape_cache=None):
+        # `_store`, inlined: this runs for every record
+        try:
+            store = self._local.store
+        except AttributeError:
+            store = self._new_store(pipeline)
+        if len(pipeline) != store.size:
+            raise ValueError('a Metrics instance tracks a single pipeline')
+        store.records += 1
+        if self.sample_every and not store.records % self.sample_every:
+            return self._process_sampled(
+                store, d, pipeline, stage_definitions, shape_cache)
+
+        for position, (stage_name, stage_option) in enumerate(pipeline):
+            handler = stage_definitions[stage_name]
+            try:
+                if shape_cache is not None and hasattr(handler, 'plan'):
+                    d = shape_cache.run(handler, d, stage_option)
+                else:
+                    d = handler(d, stage_option)
+            except Exception:
+                store.errors[position] += 1
+                raise
+            if d is DROPPED:
+                store.dropped[position] += 1
+                return DROPPED
+        return d
+
+    def _process_sampled(self, store, d, pipeline, stage_definitions,
+                         shape_cache):
+        started = default_timer()
+        for position, (stage_name, stage_option) in enumerate(pipeline):
+            handler = stage_definitions[stage_name]
+            start = default_timer()
+            try:
+                if shape_cache is not None and hasattr(handler, 'plan'):
+                    d = shape_cache.run(handler, d, stage_option)
+                else:
+                    d = handler(d, stage_option)
+            except Exception:
+                store.errors[position] += 1
+                raise
+            store.stage_latency[position].observe(default_timer() - start)
+            if d is DROPPED:
+                store.dropped[position] += 1
+                break
+        store.latency.observe(default_timer() - started)
+        return d
+
+    def process_many(self, ds, pipeline, stage_definitions,
+                     shape_cache=None):
+        store = self._store(pipeline)
+        if shape_cache is None:
+            shape_cache = ShapeCache()
+        stages = []
+        for position, (stage_name, stage_option) in enumerate(pipeline):
+            handler = stage_definitions[stage_name]
+            if hasattr(handler, 'plan') and \
+                    not hasattr(handler, 'process_many'):
+                handler = partial(shape_cache.run, handler)
+            stages.append((position, handler, stage_option))
+        batch_positions = frozenset(
+            position for position, handler, _ in stages
+            if hasattr(handler, 'process_many'))
+        with self._lock:
+            self.batch_positions = batch_positions
+
+        # Consecutive record stages run in a single loop, which only
+        # counts the records they drop; the outputs of batch stages,
+        # which can merge records, are counted on their way out.
+        outputs = iter(ds)
+        count_inputs = True
+        while stages:
+            position, handler, stage_option = stages[0]
+            if position in batch_positions:
+                if count_inputs:
+                    outputs = self._count_inputs(outputs, store)
+                outputs = self._observe(
+                    handler.process_many(outputs, stage_option),
+                    store, position, len(stages) == 1)
+                stages = stages[1:]
+            else:
+                end = 1
+                while end < len(stages) and \
+                        stages[end][0] not in batch_positions:
+                    end += 1
+                outputs = self._process_records(
+                    outputs, store, stages[:end], count_inputs,
+                    end == len(stages))
+                stages = stages[end:]
+            count_inputs = False
+        if count_inputs:
+            outputs = self._count_inputs(outputs, store)
+        return outputs
+
+    def _count_inputs(self, ds, store):
+        for d in ds:
+            store.batch_records += 1
+            yield d
+
+    def _process_records(self, ds, store, stages, count_inputs, last):
+        dropped = store.batch_dropped
+        sample_every = self.sample_every
+        seen = 0
+        for d in ds:
+            if count_inputs:
+                store.batch_records += 1
+            seen += 1
+            if sample_every and not seen % sample_every:
+                d = self._process_records_sampled(store, d, stages, last)
+                if d is not DROPPED:
+                    yield d
+                continue
+
+            for position, handler, stage_option in stages:
+                try:
+                    d = handler(d, stage_option)
+                except Exception as e:
+                    store.last_error = e
+                    store.batch_errors[position] += 1
+                    raise
+                if d is DROPPED:
+                    dropped[position] += 1
+                    break
+            else:
+                yield d
+
+    def _process_records_sampled(self, store, d, stages, last):
+        started = default_timer()
+        for position, handler, stage_option in stages:
+            start = default_timer()
+            try:
+                d = handler(d, stage_option)
+            except Exception as e:
+                store.last_error = e
+                store.batch_errors[position] += 1
+                raise
+            store.stage_latency[position].observe(default_timer() - start)
+            if d is DROPPED:
+                store.batch_dropped[position] += 1
+                break
+        if last:
+            store.latency.observe(default_timer() - started)
+        return d
+
+    def _observe(self, outputs, store, position, last):
+        outputs_count = store.outputs
+        histograms = [store.stage_latency[position]]
+        if last:
+            histograms.append(store.latency)
+        sample_every = self.sample_every
+        start = None
+        try:
+            for d in outputs:
+                if start is not None:
+                    elapsed = default_timer() - start
+                    for histogram in histograms:
+                        histogram.observe(elapsed)
+                    start = None
+                outputs_count[position] += 1
+                yield d
+                if sample_every and \
+                        not outputs_count[position] % sample_every:
+                    start = default_timer()
+        except Exception as e:
+            # Downstream stages see the exception too: count it once
+            if e is not store.last_error:
+                store.last_error = e
+                store.batch_errors[position] += 1
+            raise
+
+    def snapshot(self):
+        """
+        Return the current measures, adding up the ones of every thread:
+            - records, outputs, dropped, errors: record counts, where
+              `dropped` includes the records merged by batch stages;
+            - error_rate: errors / records;
+            - rate: records per second, since the metrics were created;
+            - latency: a histogram of the sampled latencies, with its
+              `count`, `sum`, `mean` and cumulative `buckets`, as
+              (upper bound, count) tuples;
+            - stages: the same measures of every stage, by label.
+        """
+        with self._lock:
+            threads = list(self._threads)
+            labels = list(self.stages or ())
+            batch_positions = self.batch_positions
+
+        size = len(labels)
+        records = batch_records = 0
+        dropped = [0] * size
+        errors = [0] * size
+        outputs = [0] * size
+        batch_dropped = [0] * size
+        batch_errors = [0] * size
+        latency = _Histogram(self.buckets)
+        stage_latency = [_Histogram(self.buckets) for _ in range(size)]
+        for store in threads:
+            records += store.records
+            batch_records += store.batch_records
+            dropped = _add(dropped, store.dropped)
+            errors = _add(errors, store.errors)
+            outputs = _add(outputs, store.outputs)
+            batch_dropped = _add(batch_dropped, store.batch_dropped)
+            batch_errors = _add(batch_errors, store.batch_errors)
+            latency.merge(store.latency)
+            for histogram, other in zip(stage_latency, store.stage_latency):
+                histogram.merge(other)
+
+        stages = OrderedDict()
+        record_inputs, batch_inputs = records, batch_records
+        for position, label in enumerate(labels):
+            # Records processed one at a time stop at the stage dropping
+            # them, or raising; so do streamed ones, unless the stage
+            # processes batches: then they're counted on the output.
+            record_outputs = record_inputs - dropped[position] \
+                - errors[position]
+            if position in batch_positions:
+                batch_outputs = outputs[position]
+            else:
+                batch_outputs = batch_inputs - batch_dropped[position] \
+                    - batch_errors[position]
+            calls = record_inputs + batch_inputs
+            stage_outputs = record_outputs + batch_outputs
+            stage_errors = errors[position] + batch_errors[position]
+            stages[label] = _summary(
+                calls, stage_outputs, stage_errors, stage_latency[position])
+            record_inputs, batch_inputs = record_outputs, batch_outputs
+
+        total = records + batch_records
+        pipeline_outputs = record_inputs + batch_inputs
+        summary = _summary(total, pipeline_outputs,
+                           sum(errors) + sum(batch_errors), latency)
+        summary['records'] = summary.pop('calls')
+        summary['name'] = self.name
+        summary['rate'] = total / (default_timer() - self.started)
+        summary['stages'] = stages
+        return summary
+
+
+def _add(a, b):
+    return [x + y for x, y in zip(a, b)]
+
+
+def _summary(calls, outputs, errors, histogram):
+    return {
+        'calls': calls,
+        'outputs': outputs,
+        'dropped': max(calls - outputs - errors, 0),
+        'errors': errors,
+        'error_rate': errors / calls if calls else 0.0,
+        'latency': histogram.snapshot(),
+    }
+
+
+##############################################################
+#                     Prometheus exporter                    #
+##############################################################
+
+def _label(value):
+    return '"%s"' % str(value).replace('\\', '\\\\').replace(
+        '"', '\\"').replace('\n', '\\n')
+
+
+def _format_bound(bound):
+    return '+Inf' if bound == float('inf') else repr(float(bound))
+
+
+_COUNTERS = (
+    ('calls', 'records_total', 'Records processed'),
+    ('outputs', 'outputs_total', 'Records output'),
+    ('dropped', 'dropped_total', 'Records dropped'),
+    ('errors', 'errors_total', 'Exceptions raised'),
+)
+
+
+def prometheus_text(metrics):
+    """
+    Format the snapshots of a list of `Metrics` in the Prometheus text
+    exposition format. Pipeline metrics are prefixed by `processr_`,
+    stage metrics by `processr_stage_` and labelled by stage.
+    """
+    snapshots = [m.snapshot() for m in metrics]
+    lines = []
+    for scope, prefix in (('pipeline', 'processr_'),
+                          ('stage', 'processr_stage_')):
+        series = []
+        for snapshot in snapshots:
+            pipeline = 'pipeline=%s' % _label(snapshot['name'])
+            if scope == 'pipeline':
+                summary = dict(snapshot, calls=snapshot['records'])
+                series.append((pipeline, summary))
+            else:
+                for stage, summary in snapshot['stages'].items():
+                    series.append(
+                        ('%s,stage=%s' % (pipeline, _label(stage)), summary))
+
+        for key, name, description in _COUNTERS:
+            lines.append('# HELP %s%s %s' % (prefix, name, description))
+            lines.append('# TYPE %s%s counter' % (prefix, name))
+            for labels, summary in series:
+                lines.append('%s%s{%s} %d' % (
+                    prefix, name, labels, summary[key]))
+
+        name = prefix + 'latency_seconds'
+        lines.append('# HELP %s Sampled latency' % name)
+        lines.append('# TYPE %s histogram' % name)
+        for labels, summary in series:
+            latency = summary['latency']
+            for bound, count in latency['buckets']:
+                lines.append('%s_bucket{%s,le="%s"} %d' % (
+                    name, labels, _format_bound(bound), count))
+            lines.append('%s_sum{%s} %r' % (name, labels, latency['sum']))
+            lines.append('%s_count{%s} %d' % (
+                name, labels, latency['count']))
+    return '\n'.join(lines) + '\n'
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = prometheus_text(self.server.metrics).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(metrics, port=9100, host='127.0.0.1'):
+    """
+    Serve the metrics of a list of `Metrics` on http://host:port/metrics
+    from a daemon thread, returning the server: call its `shutdown()`
+    and `server_close()` methods to stop it.
+    """
+    server = HTTPServer((host, port), _MetricsHandler)
+    server.metrics = list(metrics)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    return server
@@ -0,0 +1,318 @@
+# -*- coding: utf-8 -*-
+
+import heapq
+import multiprocessing
+import pickle
+import queue
+from collections import deque
+from multiprocessing import resource_tracker
+
+from processr.processr import (process, process_many, StageDefinitions,
+                               DROPPED)
+from processr.transport import write_batch, read_batch, unlink_batch
+from processr.utils import as_tuple, record_key, chunks
+
+
+##############################################################
+#                    Parallel batch execution                #
+##############################################################
+
+# Set in every worker by `_init_worker`
+_worker_pipeline = None
+_worker_stage_definitions = None
+
+
+def _init_worker(pipeline, stage_definitions):
+    global _worker_pipeline, _worker_stage_definitions
+    _worker_pipeline = pipeline
+    _worker_stage_definitions = stage_definitions
+
+
+def _process_chunk(chunk):
+    return list(
+        process_many(chunk, _worker_pipeline, _worker_stage_definitions)
+    )
+
+
+def _process_shared_chunk(handle):
+    # The parent process owns (and unlinks) the input block,
+    # while the output block is unlinked by the parent once read.
+    chunk = read_batch(handle)
+    return write_batch(_process_chunk(chunk))
+
+
+class _PickleTransport(object):
+
+    def submit(self, pool, chunk):
+        return pool.apply_async(_process_chunk, (chunk, )), None
+
+    def collect(self, result, handle):
+        return result.get()
+
+    def discard(self, result, handle):
+        pass
+
+
+class _SharedMemoryTransport(object):
+
+    def submit(self, pool, chunk):
+        handle = write_batch(chunk)
+        return pool.apply_async(_process_shared_chunk, (handle, )), handle
+
+    def collect(self, result, handle):
+        try:
+            return read_batch(result.get(), unlink=True)
+        finally:
+            unlink_batch(handle)
+
+    def discard(self, result, handle):
+        handles = [handle]
+        if result.ready() and result.successful():
+            handles.append(result.get())
+        for handle in handles:
+            try:
+                unlink_batch(handle)
+            except OSError:
+                pass
+
+
+class _AutoTransport(object):
+    # Columnar encoding only pays off on wide records: below this number
+    # of keys, pickling the chunk is faster (see benchmarks/transport.py)
+    min_shared_keys = 32
+
+    def __init__(self):
+        self.pickle = _PickleTransport()
+        self.shared_memory = _SharedMemoryTransport()
+
+    def submit(self, pool, chunk):
+        if chunk and len(chunk[0]) >= self.min_shared_keys:
+            transport = self.shared_memory
+        else:
+            transport = self.pickle
+        result, handle = transport.submit(pool, chunk)
+        return result, (transport, handle)
+
+    def collect(self, result, handle):
+        transport, handle = handle
+        return transport.collect(result, handle)
+
+    def discard(self, result, handle):
+        transport, handle = handle
+        transport.discard(result, handle)
+
+
+TRANSPORTS = {
+    'auto': _AutoTransport,
+    'pickle': _PickleTransport,
+    'shared_memory': _SharedMemoryTransport,
+}
+
+
+def parallel_process_many(ds, pipeline, stage_definitions=StageDefinitions(),
+                          processes=None, chunk_size=1000,
+                          transport='auto'):
+    """
+    Like `process_many`, but process chunks of `chunk_size` dictionaries
+    in a pool of worker processes. Output order is preserved.
+    Batch stages see one chunk at a time, so their state (e.g. the one
+    of `aggregate` or `dedupe`) doesn't span across chunks.
+
+    With the 'shared_memory' transport, every chunk is serialized once
+    in a shared memory block (numeric fields by column) and only its
+    handle is sent to a worker, which writes its output in another block.
+    The 'pickle' transport sends chunks through the pool pipes, which is
+    faster for narrow records. The 'auto' transport picks one of them
+    for every chunk, according to the number of keys of its first record.
+
+    The pipeline is handed to the workers when they're started: unless
+    processes are forked, it must be picklable.
+
+    :param ds: an iterable of dictionaries to process
+    :param pipeline: the processing pipeline
+    :param stage_definitions: a (stage_name, stage_handler) mapping
+    :param processes: the number of worker processes.
+        Defaults to the number of CPUs
+    :param chunk_size: the number of dictionaries sent to a worker at once
+    :param transport: 'auto', 'shared_memory' or 'pickle'
+    :return: an iterator of dictionaries
+    """
+    transport = TRANSPORTS[transport]()
+    processes = processes or multiprocessing.cpu_count()
+    # Workers must inherit the tracker of the parent process, otherwise
+    # each one would try to release the blocks it has seen on exit.
+    resource_tracker.ensure_running()
+    pool = multiprocessing.Pool(
+        processes, initializer=_init_worker,
+        initargs=(pipeline, stage_definitions)
+    )
+    # Bound the chunks in flight, so that memory usage doesn't depend
+    # on the length of the input.
+    max_pending = 2 * processes
+    pending = deque()
+    try:
+        for chunk in chunks(ds, chunk_size):
+            pending.append(transport.submit(pool, chunk))
+            if len(pending) >= max_pending:
+                for d in transport.collect(*pending.popleft()):
+                    yield d
+        while pending:
+            for d in transport.collect(*pending.popleft()):
+                yield d
+    finally:
+        pool.terminate()
+        pool.join()
+        for result, handle in pending:
+            transport.discard(result, handle)
+
+
+##############################################################
+#                 Key-partitioned parallel execution         #
+##############################################################
+
+def _partition_worker(partition, pipeline, stage_definitions, inbox,
+                      outbox):
+    # Messages are pickled here: the Queue feeder thread would silently
+    # drop the ones which can't be pickled, leaving the parent waiting.
+    while True:
+        chunk = inbox.get()
+        if chunk is None:
+            return
+        try:
+            outputs = [
+                (seq, process(d, pipeline, stage_definitions))
+                for seq, d in chunk
+            ]
+            message = pickle.dumps(
+                (partition, 'ok', outputs), pickle.HIGHEST_PROTOCOL)
+        except Exception as e:
+            try:
+                message = pickle.dumps(
+                    (partition, 'error', e), pickle.HIGHEST_PROTOCOL)
+            except Exception:
+                message = pickle.dumps(
+                    (partition, 'error', RuntimeError(repr(e))),
+                    pickle.HIGHEST_PROTOCOL)
+            outbox.put(message)
+            return
+        outbox.put(message)
+
+
+def partitioned_process_many(ds, pipeline, key,
+                             stage_definitions=StageDefinitions(),
+                             partitions=None, chunk_size=100, ordered=False):
+    """
+    Process an iterable of dictionaries in `partitions` worker processes,
+    routing every dictionary to a worker according to the hash of its
+    `key` fields: dictionaries with equal keys (e.g. 1 and 1.0) go to
+    the same worker. Each worker processes its dictionaries one at a time
+    (with `process`) in the input order, so transformers keeping
+    a state per key (e.g. running totals) see all the dictionaries
+    of a key, in order. Batch-only stages (e.g. `aggregate`)
+    are not supported.
+
+    Outputs are yielded as soon as they're available, or in the input
+    order if `ordered` is True. Like with `parallel_process_many`,
+    the pipeline must be picklable unless processes are forked.
+
+    :param ds: an iterable of dictionaries to process
+    :param pipeline: the processing pipeline
+    :param key: the field (or the fields) to partition on
+    :param stage_definitions: a (stage_name, stage_handler) mapping
+    :param partitions: the number of worker processes.
+        Defaults to the number of CPUs
+    :param chunk_size: every `chunk_size` dictionaries, the pending ones
+        are sent to their workers
+    :param ordered: yield the outputs in the input order
+    :return: an iterator of dictionaries
+    """
+    keys = as_tuple(key)
+    partitions = partitions or multiprocessing.cpu_count()
+    inboxes = [multiprocessing.Queue() for _ in range(partitions)]
+    outbox = multiprocessing.Queue()
+    workers = [
+        multiprocessing.Process(
+            target=_partition_worker,
+            args=(partition, pipeline, stage_definitions, inbox, outbox)
+        )
+        for partition, inbox in enumerate(inboxes)
+    ]
+    for worker in workers:
+        worker.daemon = True
+        worker.start()
+
+    # Sequence numbers of the outputs waiting for the previous ones
+    reorder_buffer = []
+    state = {'next_seq': 0, 'in_flight': 0}
+    # The chunks sent to each worker, and not received back yet
+    pending = [0] * partitions
+    max_in_flight = 4 * partitions
+
+    def receive():
+        while True:
+            # Checked before waiting: the messages a worker put before
+            # exiting are already in the queue.
+            dead = any(count and not worker.is_alive()
+                       for count, worker in zip(pending, workers))
+            try:
+                message = outbox.get(timeout=0.1 if dead else 1)
+                break
+            except queue.Empty:
+                if dead:
+                    raise RuntimeError('a partition worker died')
+        try:
+            partition, status, outputs = pickle.loads(message)
+        except Exception as e:
+            raise RuntimeError(
+                'a partition worker sent an invalid message: %r' % (e, ))
+        if status == 'error':
+            raise outputs
+        pending[partition] -= 1
+        state['in_flight'] -= 1
+        if not ordered:
+            return [d for _, d in outputs if d is not DROPPED]
+
+        for item in outputs:
+            heapq.heappush(reorder_buffer, item)
+        ready = []
+        while reorder_buffer and reorder_buffer[0][0] == state['next_seq']:
+            _, d = heapq.heappop(reorder_buffer)
+            state['next_seq'] += 1
+            if d is not DROPPED:
+                ready.append(d)
+        return ready
+
+    def send(buffers):
+        for partition, (inbox, buffer) in enumerate(zip(inboxes, buffers)):
+            if buffer:
+                inbox.put(buffer)
+                pending[partition] += 1
+                state['in_flight'] += 1
+        return [[] for _ in range(partitions)]
+
+    try:
+        buffers = [[] for _ in range(partitions)]
+        for seq, d in enumerate(ds):
+            # Routing happens in this process only, so the built-in hash
+            # is stable, and sends equal keys (1, 1.0) to the same worker
+            partition = hash(record_key(d, keys)) % partitions
+            buffers[partition].append((seq, d))
+            if (seq + 1) % chunk_size:
+                continue
+            buffers = send(buffers)
+            while state['in_flight'] >= max_in_flight:
+                for output in receive():
+                    yield output
+
+        send(buffers)
+        for inbox in inboxes:
+            inbox.put(None)
+        while state['in_flight']:
+            for output in receive():
+                yield output
+        for worker in workers:
+            worker.join()
+    finally:
+        for worker in workers:
+            if worker.is_alive():
+                worker.terminate()
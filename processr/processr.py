@@ -1,11 +1,13 @@
 # -*- coding: utf-8 -*-
 
-from __future__ import absolute_import
-
+import heapq
 import logging
 from itertools import chain
+from operator import itemgetter
 
-from processr.compat import reduce, abc, NullHandler
+from processr.compat import reduce, abc, NullHandler, entry_points
+from processr.sorting import external_sort, sort_key
+from processr.utils import as_tuple, record_key, chunks, LRUCache
 
 # initialize log & set default logging handler
 # to avoid 'No handler found' warnings.
@@ -17,6 +19,22 @@ log.addHandler(NullHandler())
 #                           Stages                           #
 ##############################################################
 
+class _Dropped(object):
+    """
+    The type of `DROPPED`: returned by a stage handler (or by a
+    `transform_dict` transformer) to discard the record.
+    """
+
+    def __repr__(self):
+        return 'DROPPED'
+
+    def __reduce__(self):
+        # Unpickle to the very same object, so that `is` checks hold.
+        return 'DROPPED'
+
+
+DROPPED = _Dropped()
+
 
 def rename_keys(d, stage_opts):
     """
@@ -109,30 +127,635 @@ def transform_dict(d, stage_opts):
     return process_value(d, stage_opts)
 
 
+def _merge_match(d, match, fields):
+    output = dict(d)
+    if match is not None:
+        output.update(
+            match if fields is None else ((k, match[k]) for k in fields)
+        )
+    return output
+
+
+def enrich(d, stage_opts):
+    """
+    Return a new dictionary with the items of `d` updated with the fields
+    of the matching record in a lookup index (see `processr.lookup`).
+    If no record is found, `d` is copied untouched.
+
+    >>> from processr.lookup import HashIndex
+    >>> index = HashIndex([{'code': 'IT', 'country': 'Italy'}], 'code')
+    >>> enrich({'code': 'IT'}, {'index': index, 'fields': ('country', )})
+    {'code': 'IT', 'country': 'Italy'}
+
+    `stage_opts` is a dictionary with the following items:
+        - index: the lookup index;
+        - keys (optional): the field(s) of `d` used to build the lookup
+          key. Defaults to the fields the index is keyed on;
+        - fields (optional): the fields of the matching record to copy.
+          Defaults to all of them;
+        - chunk_size (optional): how many records are looked up
+          at once by `process_many`. Defaults to 1000.
+
+    :param d: the input dictionary
+    :param stage_opts: a dictionary of options
+    :return: a dictionary
+    """
+    index = stage_opts['index']
+    keys = as_tuple(stage_opts.get('keys', index.keys))
+    match = index.get(record_key(d, keys))
+    return _merge_match(d, match, stage_opts.get('fields'))
+
+
+def enrich_many(ds, stage_opts):
+    """
+    Like `enrich`, but work on an iterable of dictionaries, looking up
+    the keys of a whole chunk of records with a single `get_many` call.
+    """
+    index = stage_opts['index']
+    keys = as_tuple(stage_opts.get('keys', index.keys))
+    fields = stage_opts.get('fields')
+
+    for chunk in chunks(ds, stage_opts.get('chunk_size', 1000)):
+        chunk_keys = [record_key(d, keys) for d in chunk]
+        matches = index.get_many(set(chunk_keys))
+        for d, key in zip(chunk, chunk_keys):
+            yield _merge_match(d, matches.get(key), fields)
+
+
+# Stages working better on whole streams expose a batch handler,
+# which `process_many` uses in place of the per-record one. Batch
+# handlers yielding one output per input, in order, are marked as
+# `one_to_one`; stages whose per-record handler raises (many-to-few
+# or reordering ones) as `stream_only`.
+enrich.process_many = enrich_many
+enrich.one_to_one = True
+
+
+def aggregate(d, stage_opts):
+    """
+    Aggregate a stream of dictionaries (see `processr.aggregate`).
+    Being a many-to-few transformation it's available only
+    through `process_many`, as a terminal stage:
+
+    >>> from processr.aggregate import Aggregation
+    >>> pipeline = [
+    ...     ('aggregate', Aggregation(metrics={'n': ('count', None)}))
+    ... ]
+    >>> list(process_many([{'the_answer': 42}] * 42, pipeline))
+    [{'n': 42}]
+
+    :param d: the input dictionary
+    :param stage_opts: an `Aggregation`
+    """
+    raise TypeError('aggregate works on streams, use process_many')
+
+
+def aggregate_many(ds, stage_opts):
+    return stage_opts.process_many(ds)
+
+
+aggregate.process_many = aggregate_many
+aggregate.stream_only = True
+
+
+def _all(predicates):
+    if isinstance(predicates, abc.Callable):
+        return predicates
+    predicates = tuple(predicates)
+    return lambda d: all(predicate(d) for predicate in predicates)
+
+
+def filter_records(d, stage_opts):
+    """
+    Return `d` if it satisfies the given predicate (or all the given
+    predicates, evaluated in order), else `DROPPED`. The remaining
+    stages aren't run on dropped records.
+
+    >>> filter_records({'the_answer': 42}, lambda d: d['the_answer'] == 42)
+    {'the_answer': 42}
+    >>> filter_records({'the_answer': 54}, lambda d: d['the_answer'] == 42)
+    DROPPED
+
+    :param d: the input dictionary
+    :param stage_opts: a predicate, or a list of predicates
+    :return: `d` or `DROPPED`
+    """
+    return d if _all(stage_opts)(d) else DROPPED
+
+
+def filter_records_many(ds, stage_opts):
+    predicate = _all(stage_opts)
+    return (d for d in ds if predicate(d))
+
+
+filter_records.process_many = filter_records_many
+
+
+def dedupe(d, stage_opts):
+    """
+    Drop the dictionaries whose key was already met in the stream,
+    according to a duplicate filter (see `processr.dedupe`).
+
+    >>> from processr.dedupe import ExactFilter
+    >>> pipeline = [('dedupe', {'keys': 'id', 'filter': ExactFilter()})]
+    >>> list(process_many([{'id': 1}, {'id': 2}, {'id': 1}], pipeline))
+    [{'id': 1}, {'id': 2}]
+
+    `stage_opts` is a dictionary with the following items:
+        - keys: the field(s) used to build the record key;
+        - filter: the duplicate filter. Its `dropped` attribute
+          counts the dropped records.
+
+    :param d: the input dictionary
+    :param stage_opts: a dictionary of options
+    :return: `d` or `DROPPED`
+    """
+    key = record_key(d, as_tuple(stage_opts['keys']))
+    return DROPPED if stage_opts['filter'].check(key) else d
+
+
+def dedupe_many(ds, stage_opts):
+    keys = as_tuple(stage_opts['keys'])
+    check = stage_opts['filter'].check
+    return (d for d in ds if not check(record_key(d, keys)))
+
+
+dedupe.process_many = dedupe_many
+
+
+def intern_values(d, stage_opts):
+    """
+    Return a new dictionary whose keys, and values of the given fields,
+    are replaced by the canonical objects of an intern pool (see
+    `processr.interning`). Add it at the end of a pipeline whose outputs
+    are retained in memory, for the fields with few distinct values.
+
+    >>> from processr.interning import InternPool
+    >>> opts = {'pool': InternPool(), 'fields': ('status', )}
+    >>> intern_values({'status': 'ok', 'the_answer': 42}, opts)
+    {'status': 'ok', 'the_answer': 42}
+
+    `stage_opts` is a dictionary with the following items:
+        - pool: the `InternPool`. Its `saved_bytes` attribute estimates
+          the memory saved so far;
+        - fields (optional): the field(s) whose values are interned.
+
+    :param d: the input dictionary
+    :param stage_opts: a dictionary of options
+    :return: a dictionary
+    """
+    intern = stage_opts['pool'].intern
+    fields = as_tuple(stage_opts.get('fields', ()))
+    return dict(
+        (intern(k), intern(v) if k in fields else v) for k, v in d.items()
+    )
+
+
+def sort_by(d, stage_opts):
+    """
+    Sort a stream of dictionaries, spilling sorted runs to temporary
+    files when it doesn't fit in memory (see `processr.sorting`).
+    Being a stream transformation it's available only through
+    `process_many`, as a terminal stage.
+
+    >>> pipeline = [('sort_by', {'key': 'the_answer', 'reverse': True})]
+    >>> list(process_many([{'the_answer': 41}, {'the_answer': 42}], pipeline))
+    [{'the_answer': 42}, {'the_answer': 41}]
+
+    `stage_opts` is a dictionary with the following items:
+        - key: a field name, a list of field names or a callable;
+        - reverse (optional): sort in descending order;
+        - buffer_size (optional): the number of dictionaries sorted
+          in memory. Defaults to 100000;
+        - tmp_dir (optional): where temporary files are created.
+
+    :param d: the input dictionary
+    :param stage_opts: a dictionary of options
+    """
+    raise TypeError('sort_by works on streams, use process_many')
+
+
+def sort_by_many(ds, stage_opts):
+    return external_sort(
+        ds, stage_opts['key'],
+        reverse=stage_opts.get('reverse', False),
+        buffer_size=stage_opts.get('buffer_size', 100000),
+        tmp_dir=stage_opts.get('tmp_dir')
+    )
+
+
+sort_by.process_many = sort_by_many
+sort_by.stream_only = True
+
+
+def top_k(d, stage_opts):
+    """
+    Keep the `k` dictionaries with the greatest (or smallest) key
+    of a stream, using a bounded heap. Being a stream transformation
+    it's available only through `process_many`, as a terminal stage,
+    which yields them sorted.
+
+    >>> pipeline = [('top_k', {'key': 'the_answer', 'k': 1})]
+    >>> list(process_many([{'the_answer': 42}, {'the_answer': 6}], pipeline))
+    [{'the_answer': 42}]
+
+    `stage_opts` is a dictionary with the following items:
+        - key: a field name, a list of field names or a callable;
+        - k: the number of dictionaries to keep;
+        - largest (optional): keep the greatest keys. Defaults to True.
+
+    :param d: the input dictionary
+    :param stage_opts: a dictionary of options
+    """
+    raise TypeError('top_k works on streams, use process_many')
+
+
+def top_k_many(ds, stage_opts):
+    select = heapq.nlargest if stage_opts.get('largest', True) \
+        else heapq.nsmallest
+    return iter(select(stage_opts['k'], ds, key=sort_key(stage_opts['key'])))
+
+
+top_k.process_many = top_k_many
+top_k.stream_only = True
+
+
+class _Route(object):
+    """
+    A sub-pipeline whose stage handlers have been looked up, with the
+    `ShapeCache` used to run it on groups of records.
+    """
+
+    def __init__(self, pipeline, stage_definitions):
+        self.stages = [
+            (stage_definitions[stage_name], stage_option)
+            for stage_name, stage_option in pipeline
+        ]
+        self.stream_only = [
+            stage_name for (stage_name, _), (handler, _)
+            in zip(pipeline, self.stages)
+            if getattr(handler, 'stream_only', False)
+        ]
+        self.shape_cache = ShapeCache()
+
+    def __call__(self, d):
+        for handler, stage_option in self.stages:
+            d = handler(d, stage_option)
+            if d is DROPPED:
+                return DROPPED
+        return d
+
+    def apply(self, ds):
+        # Run the stages one at a time on the whole group, keeping
+        # the outputs (or DROPPED) aligned to the inputs: one-to-one
+        # batch handlers get the group at once, other stages are
+        # applied to every record, through the shape plans.
+        outputs = list(ds)
+        for handler, stage_option in self.stages:
+            alive = [i for i, d in enumerate(outputs) if d is not DROPPED]
+            if not alive:
+                break
+            if getattr(handler, 'one_to_one', False):
+                results = handler.process_many(
+                    [outputs[i] for i in alive], stage_option)
+            elif hasattr(handler, 'plan'):
+                results = [self.shape_cache.run(handler, outputs[i],
+                                                stage_option)
+                           for i in alive]
+            else:
+                results = [handler(outputs[i], stage_option) for i in alive]
+            for i, d in zip(alive, results):
+                outputs[i] = d
+        return outputs
+
+    def many(self, ds):
+        return _process_stages(ds, self.stages, self.shape_cache)
+
+
+class _Router(object):
+
+    def __init__(self, routes, default, route_of, chunk_size, ordered):
+        self.routes = routes
+        self.default = default
+        self.route_of = route_of
+        self.chunk_size = chunk_size
+        self.ordered = ordered
+
+    def __call__(self, d):
+        return self.routes.get(self.route_of(d), self.default)(d)
+
+    def many(self, ds):
+        # Group the (indexes of the) records of a chunk by route,
+        # so that every sub-pipeline runs on contiguous records.
+        routes, default, route_of = self.routes, self.default, self.route_of
+        for chunk in chunks(ds, self.chunk_size):
+            groups = {}
+            for index, d in enumerate(chunk):
+                route = routes.get(route_of(d), default)
+                group = groups.get(route)
+                if group is None:
+                    group = groups[route] = []
+                group.append(index)
+
+            if not self.ordered:
+                for route, group in groups.items():
+                    for d in route.many([chunk[i] for i in group]):
+                        yield d
+                continue
+
+            outputs = [DROPPED] * len(chunk)
+            for route, group in groups.items():
+                for index, d in zip(group,
+                                    route.apply([chunk[i] for i in group])):
+                    outputs[index] = d
+            for d in outputs:
+                if d is not DROPPED:
+                    yield d
+
+
+# id(stage_opts) -> (stage_opts, router): sub-pipelines are prepared once
+_routers = LRUCache(maxsize=128)
+
+
+def _router(stage_opts, build):
+    cached = _routers.get(id(stage_opts))
+    if cached is not None:
+        return cached[1]
+    stage_definitions = stage_opts.get('stage_definitions') \
+        or StageDefinitions()
+    router = build(stage_opts, stage_definitions)
+    if router.ordered:
+        for route in [router.default] + list(router.routes.values()):
+            if route.stream_only:
+                raise TypeError(
+                    '%s can\'t keep the input order: set ordered to False'
+                    % ', '.join(route.stream_only))
+    # Holding a reference to stage_opts guarantees that its id
+    # isn't reused by another object while the router is cached.
+    _routers[id(stage_opts)] = (stage_opts, router)
+    return router
+
+
+def _build_when(stage_opts, stage_definitions):
+    predicate = _all(stage_opts['predicate'])
+    routes = {True: _Route(stage_opts['pipeline'], stage_definitions)}
+    return _Router(routes, _Route([], stage_definitions),
+                   lambda d: bool(predicate(d)),
+                   stage_opts.get('chunk_size', 1000),
+                   stage_opts.get('ordered', True))
+
+
+def _build_branch(stage_opts, stage_definitions):
+    key = stage_opts['key']
+    route_of = key if isinstance(key, abc.Callable) \
+        else lambda d: d.get(key)
+    routes = dict(
+        (value, _Route(pipeline, stage_definitions))
+        for value, pipeline in stage_opts['branches'].items()
+    )
+    return _Router(routes, _Route(stage_opts.get('default', []),
+                                  stage_definitions),
+                   route_of, stage_opts.get('chunk_size', 1000),
+                   stage_opts.get('ordered', True))
+
+
+def when(d, stage_opts):
+    """
+    Process the dictionaries satisfying a predicate with a sub-pipeline,
+    passing the others through untouched. With `process_many`, records
+    are processed by chunks, like with `branch`.
+
+    >>> opts = {'predicate': lambda d: d['the_answer'] > 41,
+    ...         'pipeline': [('rename_keys', {'the_answer': 'answer'})]}
+    >>> list(process_many([{'the_answer': 41}, {'the_answer': 42}],
+    ...                   [('when', opts)]))
+    [{'the_answer': 41}, {'answer': 42}]
+
+    `stage_opts` is a dictionary with the following items:
+        - predicate: a predicate, or a list of predicates;
+        - pipeline: the sub-pipeline;
+        - stage_definitions (optional): the stage handlers of the
+          sub-pipeline. Defaults to the default stages;
+        - chunk_size, ordered (optional): see `branch`.
+
+    :param d: the input dictionary
+    :param stage_opts: a dictionary of options
+    :return: a dictionary, or `DROPPED`
+    """
+    return _router(stage_opts, _build_when)(d)
+
+
+def when_many(ds, stage_opts):
+    return _router(stage_opts, _build_when).many(ds)
+
+
+when.process_many = when_many
+
+
+def branch(d, stage_opts):
+    """
+    Route each dictionary to the sub-pipeline of the value of its
+    `key` field, through a single lookup. The stage handlers of the
+    sub-pipelines are looked up once, and kept while the stage options
+    are in use: they must not be mutated.
+
+    With `process_many` the input is split in chunks of `chunk_size`
+    dictionaries, and every sub-pipeline runs on its dictionaries of a
+    chunk at once, one stage at a time: stages with a one-to-one batch
+    handler (e.g. `enrich`) process them with a single call, others
+    one dictionary at a time. Outputs keep the input order, so stages
+    working only on streams (`aggregate`, `sort_by`, `top_k`) raise
+    TypeError, unless `ordered` is False: then every sub-pipeline
+    processes its dictionaries of a chunk as a stream, with all the
+    batch handlers, outputs are grouped by branch within every chunk,
+    and stream stages of the sub-pipelines see one chunk at a time.
+
+    >>> opts = {'key': 'unit', 'branches': {
+    ...     'km': [('transform_values', {'length': lambda v: v * 1000})]}}
+    >>> list(process_many([{'unit': 'km', 'length': 2},
+    ...                    {'unit': 'm', 'length': 3}], [('branch', opts)]))
+    [{'unit': 'km', 'length': 2000}, {'unit': 'm', 'length': 3}]
+
+    `stage_opts` is a dictionary with the following items:
+        - key: a field name, or a callable returning the routing value;
+        - branches: a (routing value, sub-pipeline) mapping;
+        - default (optional): the sub-pipeline of the other values.
+          Defaults to an empty one, passing them through;
+        - stage_definitions (optional): the stage handlers of the
+          sub-pipelines. Defaults to the default stages;
+        - chunk_size (optional): defaults to 1000;
+        - ordered (optional): keep the input order. Defaults to True.
+
+    :param d: the input dictionary
+    :param stage_opts: a dictionary of options
+    :return: a dictionary, or `DROPPED`
+    """
+    return _router(stage_opts, _build_branch)(d)
+
+
+def branch_many(ds, stage_opts):
+    return _router(stage_opts, _build_branch).many(ds)
+
+
+branch.process_many = branch_many
+
+
+##############################################################
+#                  Shape-specialised plans                   #
+##############################################################
+#
+# Records of a stream usually share a handful of shapes (key sequences:
+# plans may depend on the order of the keys, e.g. when renamed keys
+# collide, so differently ordered records have different shapes).
+# Stage handlers exposing a `plan(keys, stage_opts)` function can
+# build, once per shape, a specialised `plan(d)` callable which
+# does the same job of `handler(d, stage_opts)` without per-key
+# lookups in stage_opts. Plans are cached by `ShapeCache`.
+
+def _values_getter(keys):
+    """
+    Return a function which get the tuple of values of `keys` from a dict.
+    """
+    if len(keys) == 1:
+        key = keys[0]
+        return lambda d: (d[key], )
+    elif not keys:
+        return lambda d: ()
+    return itemgetter(*keys)
+
+
+def _plan_rename_keys(keys, stage_opts):
+    output_keys = tuple(stage_opts.get(k, k) for k in keys)
+    get_values = _values_getter(keys)
+    return lambda d: dict(zip(output_keys, get_values(d)))
+
+
+def _plan_project_dict(keys, stage_opts):
+    output_keys = tuple(stage_opts)
+    for key in output_keys:
+        if key not in keys:
+            raise KeyError(key)
+    get_values = _values_getter(output_keys)
+    return lambda d: dict(zip(output_keys, get_values(d)))
+
+
+def _plan_transform_values(keys, stage_opts):
+    transformers = tuple(
+        (key, stage_opts[key]) for key in keys if key in stage_opts
+    )
+
+    def plan(d):
+        output = dict(d)
+        for key, fs in transformers:
+            output[key] = process_value(output[key], fs)
+        return output
+    return plan
+
+
+def _plan_transform_values_strict(keys, stage_opts):
+    for key in stage_opts:
+        if key not in keys:
+            raise KeyError(key)
+    # Like `transform_values_strict`, unchanged items come first,
+    # then the processed ones in the order of stage_opts.
+    unchanged_keys = tuple(key for key in keys if key not in stage_opts)
+    transformers = tuple(stage_opts.items())
+
+    def plan(d):
+        output = dict((key, d[key]) for key in unchanged_keys)
+        for key, fs in transformers:
+            output[key] = process_value(d[key], fs)
+        return output
+    return plan
+
+
+rename_keys.plan = _plan_rename_keys
+project_dict.plan = _plan_project_dict
+transform_values.plan = _plan_transform_values
+transform_values_strict.plan = _plan_transform_values_strict
+
+
+STAGES_ENTRY_POINT = 'processr.stages'
+
+# name -> entry point of the stages registered by the installed
+# distributions, scanned once (see `discover_stages`)
+_discovered_stages = None
+
+
+def discover_stages(refresh=False):
+    """
+    Return a (stage_name, entry_point) mapping of the stages registered
+    by the installed distributions in the `processr.stages` entry point
+    group, e.g. in setup.py:
+
+        entry_points={'processr.stages': [
+            'geocode = my_package.stages:geocode',
+        ]}
+
+    Entry points are not loaded, so stage modules are not imported.
+    The scan is cached: pass `refresh` to repeat it (e.g. after
+    installing a distribution at runtime).
+    """
+    global _discovered_stages
+    if _discovered_stages is None or refresh:
+        _discovered_stages = dict(
+            (entry_point.name, entry_point)
+            for entry_point in entry_points(STAGES_ENTRY_POINT)
+        )
+    return _discovered_stages
+
+
 class StageDefinitions(dict):
     """
     Provides a way to get a stage handler by its name, and a way
     to trivially add custom stages.
 
-    :param add_default_stages: add the 5 default stage handlers
+    Stages which haven't been added are looked up among the ones
+    registered through entry points (see `discover_stages`): their
+    module is imported when a pipeline first references them, and
+    the loaded handler is stored. Only item access (`[]`) triggers
+    the lookup.
+
+    :param add_default_stages: add the default stage handlers
+    :param discover: look up unknown stages among the entry points
     """
 
     _default_stages = {
+        'aggregate': aggregate,
+        'branch': branch,
+        'dedupe': dedupe,
+        'enrich': enrich,
+        'filter_records': filter_records,
+        'intern_values': intern_values,
         'project_dict': project_dict,
         'rename_keys': rename_keys,
+        'sort_by': sort_by,
+        'top_k': top_k,
         'transform_values': transform_values,
         'transform_dict': transform_dict,
-        'transform_values_strict': transform_values_strict
+        'transform_values_strict': transform_values_strict,
+        'when': when
     }
 
-    def __init__(self, add_default_stages=True):
+    def __init__(self, add_default_stages=True, discover=True):
 
         super(StageDefinitions, self).__init__()
+        self.discover = discover
 
         if add_default_stages:
             for stage_name, stage_handler in self._default_stages.items():
                 self[stage_name] = stage_handler
 
+    def __missing__(self, stage_name):
+        entry_point = discover_stages().get(stage_name) \
+            if self.discover else None
+        if entry_point is None:
+            raise KeyError(stage_name)
+
+        log.debug({'loading_stage': stage_name})
+        stage_handler = self[stage_name] = entry_point.load()
+        return stage_handler
+
 
 ##############################################################
 #                     Process all the things!                #
@@ -176,7 +799,49 @@ def process_value(value, fs):
     return return_value
 
 
-def process(d, pipeline, stage_definitions=StageDefinitions()):
+class ShapeCache(object):
+    """
+    A bounded cache of the plans built by stage handlers for the record
+    shapes they meet. Plans are keyed on the handler, the stage options
+    and the record shape (its keys, in order): stage options must not
+    be mutated while the cache is in use.
+
+    :param maxsize: the maximum number of cached plans
+    """
+
+    def __init__(self, maxsize=128):
+        self._plans = LRUCache(maxsize)
+
+    @property
+    def hits(self):
+        return self._plans.hits
+
+    @property
+    def misses(self):
+        return self._plans.misses
+
+    def __len__(self):
+        return len(self._plans)
+
+    def run(self, handler, d, stage_opts):
+        """
+        Process `d` with the plan built by `handler` for its shape.
+        """
+        keys = tuple(d)
+        key = (handler, id(stage_opts), keys)
+        cached = self._plans.get(key)
+        if cached is None:
+            plan = handler.plan(keys, stage_opts)
+            # Holding a reference to stage_opts guarantees that its id
+            # isn't reused by another object while the plan is cached.
+            self._plans[key] = (stage_opts, plan)
+        else:
+            _, plan = cached
+        return plan(d)
+
+
+def process(d, pipeline, stage_definitions=StageDefinitions(),
+            shape_cache=None, memory_profile=None, metrics=None):
     """
     Process a dictionary according to the given pipeline, using
     the stage handlers defined in stage_definitions.
@@ -184,14 +849,83 @@ def process(d, pipeline, stage_definitions=StageDefinitions()):
     :param d: the dictionary to process
     :param pipeline: the processing pipeline
     :param stage_definitions: a (stage_name, stage_handler) mapping
-    :return: a dictionary
+    :param shape_cache: an optional `ShapeCache` used to run
+        the stages through plans specialised on the record shape
+    :param memory_profile: an optional `processr.profiling.MemoryProfile`
+        collecting the memory allocated by each stage and transformer
+    :param metrics: an optional `processr.metrics.Metrics` counting
+        the records, drops and errors of each stage, and sampling
+        their latency
+    :return: a dictionary, or `DROPPED` if a stage discarded it
     """
-    def process_stage(d, stage):
-        stage_name, stage_option = stage
-        try:
-            handler = stage_definitions[stage_name]
-        except KeyError:
-            raise
-        return handler(d, stage_option)
-
-    return reduce(process_stage, pipeline, d)
+    if memory_profile is not None:
+        return memory_profile.process(d, pipeline, stage_definitions)
+    if metrics is not None:
+        return metrics.process(d, pipeline, stage_definitions, shape_cache)
+
+    for stage_name, stage_option in pipeline:
+        handler = stage_definitions[stage_name]
+        if shape_cache is not None and hasattr(handler, 'plan'):
+            d = shape_cache.run(handler, d, stage_option)
+        else:
+            d = handler(d, stage_option)
+        if d is DROPPED:
+            # Short-circuit: skip the remaining stages.
+            return DROPPED
+    return d
+
+
+def process_many(ds, pipeline, stage_definitions=StageDefinitions(),
+                 shape_cache=None, memory_profile=None, metrics=None):
+    """
+    Lazily process an iterable of dictionaries according to the given
+    pipeline. Stage handlers exposing a `process_many(ds, stage_opts)`
+    batch handler are given the whole stream, others are applied
+    to every dictionary, through a plan specialised on its shape
+    when the handler supports it. Dropped dictionaries are skipped,
+    and never reach the following stages.
+
+    >>> pipeline = [('rename_keys', {'the_answer': 'not_the_answer'})]
+    >>> list(process_many([{'the_answer': 42}], pipeline))
+    [{'not_the_answer': 42}]
+
+    :param ds: an iterable of dictionaries to process
+    :param pipeline: the processing pipeline
+    :param stage_definitions: a (stage_name, stage_handler) mapping
+    :param shape_cache: the `ShapeCache` holding the specialised plans.
+        Defaults to a new cache for each call
+    :param memory_profile: an optional `processr.profiling.MemoryProfile`
+        collecting the memory allocated by each stage and transformer
+    :param metrics: an optional `processr.metrics.Metrics` counting
+        the records, drops and errors of each stage, and sampling
+        their latency
+    :return: an iterator of dictionaries
+    """
+    if memory_profile is not None:
+        return memory_profile.process_many(ds, pipeline, stage_definitions)
+    if metrics is not None:
+        return metrics.process_many(
+            ds, pipeline, stage_definitions, shape_cache)
+    if shape_cache is None:
+        shape_cache = ShapeCache()
+    stages = [
+        (stage_definitions[stage_name], stage_option)
+        for stage_name, stage_option in pipeline
+    ]
+    return _process_stages(ds, stages, shape_cache)
+
+
+def _process_stages(ds, stages, shape_cache):
+    # Chain the (handler, stage_opts) stages of a pipeline on a stream.
+    def process_stage(ds, stage):
+        handler, stage_option = stage
+        batch_handler = getattr(handler, 'process_many', None)
+        if batch_handler is not None:
+            return batch_handler(ds, stage_option)
+        if hasattr(handler, 'plan'):
+            outputs = (shape_cache.run(handler, d, stage_option) for d in ds)
+        else:
+            outputs = (handler(d, stage_option) for d in ds)
+        return (d for d in outputs if d is not DROPPED)
+
+    return reduce(process_stage, stages, iter(ds))
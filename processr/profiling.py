@@ -0,0 +1,302 @@
+# -*- coding: utf-8 -*-
+
+import functools
+import gc
+import tracemalloc
+from collections import OrderedDict, deque
+
+from processr.compat import abc
+from processr.processr import (DROPPED, transform_values,
+                               transform_values_strict, transform_dict)
+
+
+##############################################################
+#                  Transformer instrumentation               #
+##############################################################
+
+def _name(f):
+    return getattr(f, '__name__', repr(f))
+
+
+def instrument(fs, wrap, label):
+    """
+    Return a copy of the transformer spec `fs` (see `process_value`)
+    whose callables are replaced by `wrap(f, label)`.
+    """
+    if isinstance(fs, tuple):
+        f, kwargs = fs
+        return wrap(f, '%s %s' % (label, _name(f))), kwargs
+    elif isinstance(fs, abc.Iterable):
+        return [
+            instrument(f, wrap, '%s/%d' % (label, position))
+            for position, f in enumerate(fs)
+        ]
+    elif isinstance(fs, abc.Callable):
+        return wrap(fs, '%s %s' % (label, _name(fs)))
+    return fs
+
+
+def instrument_stage(handler, stage_opts, wrap, label):
+    """
+    Instrument the transformers in the options of the built-in stages
+    taking transformer specs; other stage options are returned untouched.
+    """
+    if handler in (transform_values, transform_values_strict):
+        return dict(
+            (key, instrument(fs, wrap, '%s[%r]' % (label, key)))
+            for key, fs in stage_opts.items()
+        )
+    elif handler is transform_dict:
+        return instrument(stage_opts, wrap, label)
+    return stage_opts
+
+
+_ATOMIC_TYPES = (type(None), bool, int, float, complex, str, bytes)
+
+
+def retains(output, value, max_depth=3, max_objects=1000):
+    """
+    Check if `value` is reachable from `output` (e.g. a generator
+    built on it), following at most `max_depth` references.
+    """
+    if output is value or isinstance(value, _ATOMIC_TYPES):
+        return False
+
+    seen = set([id(output)])
+    queue = deque([(output, 0)])
+    while queue and len(seen) < max_objects:
+        obj, depth = queue.popleft()
+        if depth == max_depth:
+            continue
+        for referent in gc.get_referents(obj):
+            if referent is value:
+                return True
+            if id(referent) not in seen:
+                seen.add(id(referent))
+                queue.append((referent, depth + 1))
+    return False
+
+
+##############################################################
+#                       Memory profiling                     #
+##############################################################
+
+class Allocations(object):
+    """
+    Memory measures of a stage or a transformer, in bytes:
+        - allocated: the sum of the peaks reached during each call;
+        - retained: the memory still allocated after each call;
+        - retains_input: the calls whose output references their input.
+    """
+
+    def __init__(self):
+        self.calls = 0
+        self.allocated = 0
+        self.retained = 0
+        self.retains_input = 0
+
+    def add(self, retained, allocated=0):
+        self.calls += 1
+        self.retained += retained
+        self.allocated += max(allocated, 0)
+
+
+class MemoryProfile(object):
+    """
+    Attribute the memory allocated while processing dictionaries to
+    each stage and transformer of a pipeline, using `tracemalloc`
+    (which is started, if needed, while processing). Pass it as the
+    `memory_profile` argument of `process` or `process_many`, then
+    read its `report()`.
+
+    Stage measures include the ones of their transformers. With
+    `process_many` stages are lazy, so the memory a stage retains
+    is measured excluding the upstream stages, while allocation peaks
+    are only measured per record and per batch of `batch_size` records.
+
+    :param batch_size: the number of dictionaries of a batch
+    """
+
+    def __init__(self, batch_size=1000):
+        self.batch_size = batch_size
+        self.stages = OrderedDict()
+        self.transformers = OrderedDict()
+        self.records = 0
+        self.record_peak = 0
+        self.batch_peaks = []
+        self._instrumented = {}
+        self._stack = []
+        # The peak traced memory seen before the last nested reset
+        # (transformers reset the peak to measure their own).
+        self._peak = 0
+
+    def _allocations(self, table, label):
+        allocations = table.get(label)
+        if allocations is None:
+            allocations = table[label] = Allocations()
+        return allocations
+
+    def _reset_peak(self):
+        tracemalloc.reset_peak()
+        self._peak = 0
+
+    def _traced_memory(self):
+        # Like `tracemalloc.get_traced_memory`, accounting for the peaks
+        # reached before nested resets.
+        current, peak = tracemalloc.get_traced_memory()
+        return current, max(peak, self._peak)
+
+    def _wrap(self, f, label):
+        allocations = self._allocations(self.transformers, label)
+
+        @functools.wraps(f)
+        def measured(value, *args, **kwargs):
+            before, outer_peak = self._traced_memory()
+            self._reset_peak()
+            try:
+                output = f(value, *args, **kwargs)
+            finally:
+                after, peak = self._traced_memory()
+                self._peak = max(outer_peak, peak)
+            allocations.add(after - before, peak - before)
+            if retains(output, value):
+                allocations.retains_input += 1
+            return output
+        return measured
+
+    def _stages(self, pipeline, stage_definitions):
+        for position, (stage_name, stage_option) in enumerate(pipeline):
+            label = '%d %s' % (position, stage_name)
+            handler = stage_definitions[stage_name]
+            key = (label, id(stage_option))
+            cached = self._instrumented.get(key)
+            if cached is None:
+                # Keep stage_option alive, so that its id isn't reused
+                cached = self._instrumented[key] = (
+                    stage_option,
+                    instrument_stage(handler, stage_option, self._wrap, label)
+                )
+            yield label, handler, cached[1]
+
+    def _start(self):
+        if tracemalloc.is_tracing():
+            return False
+        tracemalloc.start()
+        return True
+
+    def process(self, d, pipeline, stage_definitions):
+        started = self._start()
+        try:
+            self._reset_peak()
+            start, _ = tracemalloc.get_traced_memory()
+            record_peak = 0
+            for label, handler, stage_option in self._stages(
+                    pipeline, stage_definitions):
+                before, _ = tracemalloc.get_traced_memory()
+                self._reset_peak()
+                d = handler(d, stage_option)
+                after, peak = self._traced_memory()
+                self._allocations(self.stages, label).add(
+                    after - before, peak - before)
+                record_peak = max(record_peak, peak - start)
+                if d is DROPPED:
+                    break
+            self._record(record_peak)
+            return d
+        finally:
+            if started:
+                tracemalloc.stop()
+
+    def _record(self, peak):
+        self.records += 1
+        self.record_peak = max(self.record_peak, peak)
+
+    def _measure(self, iterator, allocations):
+        # Memory allocated by the upstream stages while this one pulls
+        # its inputs is accumulated on the stack, and subtracted.
+        while True:
+            start, _ = tracemalloc.get_traced_memory()
+            self._stack.append(0)
+            try:
+                d = next(iterator)
+            except StopIteration:
+                self._stack.pop()
+                return
+            except BaseException:
+                self._stack.pop()
+                raise
+            upstream = self._stack.pop()
+            elapsed, _ = tracemalloc.get_traced_memory()
+            allocations.add(elapsed - start - upstream)
+            if self._stack:
+                self._stack[-1] += elapsed - start
+            yield d
+
+    def process_many(self, ds, pipeline, stage_definitions):
+        started = self._start()
+        try:
+            outputs = iter(ds)
+            for label, handler, stage_option in self._stages(
+                    pipeline, stage_definitions):
+                batch_handler = getattr(handler, 'process_many', None)
+                if batch_handler is not None:
+                    outputs = batch_handler(outputs, stage_option)
+                else:
+                    outputs = _apply(handler, outputs, stage_option)
+                outputs = self._measure(
+                    outputs, self._allocations(self.stages, label))
+
+            self._reset_peak()
+            batch_start, _ = tracemalloc.get_traced_memory()
+            batch_peak = 0
+            batch_records = 0
+            while True:
+                start, _ = tracemalloc.get_traced_memory()
+                try:
+                    d = next(outputs)
+                except StopIteration:
+                    break
+                _, peak = self._traced_memory()
+                self._record(peak - start)
+                batch_peak = max(batch_peak, peak - batch_start)
+                batch_records += 1
+                if batch_records == self.batch_size:
+                    self.batch_peaks.append(batch_peak)
+                    batch_peak = batch_records = 0
+                    batch_start, _ = tracemalloc.get_traced_memory()
+
+                yield d
+                self._reset_peak()
+
+            if batch_records:
+                self.batch_peaks.append(batch_peak)
+        finally:
+            if started:
+                tracemalloc.stop()
+
+    def report(self):
+        """
+        Return a human readable summary of the measures.
+        """
+        lines = ['%-40s %8s %12s %12s %8s' % (
+            'stage / transformer', 'calls', 'allocated', 'retained',
+            'retains')]
+        for title, table in (('stages', self.stages),
+                             ('transformers', self.transformers)):
+            lines.append('-- %s' % title)
+            for label, allocations in table.items():
+                lines.append('%-40s %8d %12d %12d %8s' % (
+                    label[:40], allocations.calls, allocations.allocated,
+                    allocations.retained,
+                    'input' if allocations.retains_input else ''))
+        lines.append('records: %d, peak per record: %d bytes' % (
+            self.records, self.record_peak))
+        if self.batch_peaks:
+            lines.append('batches: %d, peak per batch: %d bytes' % (
+                len(self.batch_peaks), max(self.batch_peaks)))
+        return '\n'.join(lines)
+
+
+def _apply(handler, ds, stage_option):
+    outputs = (handler(d, stage_option) for d in ds)
+    return (d for d in outputs if d is not DROPPED)
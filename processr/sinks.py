@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+
+import sqlite3
+from timeit import default_timer
+
+from processr.utils import as_tuple, chunks, quote_identifier as _quote
+
+
+_SQLITE_TYPES = (
+    (bool, 'INTEGER'),
+    (int, 'INTEGER'),
+    (float, 'REAL'),
+    (str, 'TEXT'),
+    (bytes, 'BLOB'),
+)
+
+
+def _sqlite_type(value):
+    for python_type, sqlite_type in _SQLITE_TYPES:
+        if isinstance(value, python_type):
+            return sqlite_type
+    return ''
+
+
+class SQLiteSink(object):
+    """
+    Write dictionaries (e.g. the output of `process_many`) to a table
+    of a local SQLite database, with `executemany` in transactions of
+    `batch_size` rows. The table is created if it doesn't exist, with
+    the given columns or the ones inferred from the first dictionary.
+    Missing items are written as NULL, extra ones are ignored.
+
+    >>> with SQLiteSink(':memory:', 'answers') as sink:
+    ...     sink.write([{'the_answer': 42}]).rows
+    1
+
+    :param path: the path of the SQLite database
+    :param table: the name of the table
+    :param columns: a list of column names, or a name -> SQLite type
+        mapping. Inferred from the first dictionary if not given
+    :param batch_size: the number of rows written in a transaction
+    :param wal: switch the database to write-ahead logging, letting
+        readers work while rows are written
+    :param upsert_keys: the column(s) identifying a row: rows having
+        the same keys of an existing one replace its values
+    """
+
+    def __init__(self, path, table, columns=None, batch_size=10000,
+                 wal=False, upsert_keys=None):
+        self.table = table
+        self.batch_size = batch_size
+        self.upsert_keys = as_tuple(upsert_keys) if upsert_keys else ()
+        self.rows = 0
+        self.elapsed = 0.0
+        self._columns = None
+        self._statement = None
+
+        # Transactions are handled explicitly
+        self._connection = sqlite3.connect(path, isolation_level=None)
+        if wal:
+            self._connection.execute('PRAGMA journal_mode = WAL')
+            self._connection.execute('PRAGMA synchronous = NORMAL')
+        if columns is not None:
+            self._prepare(columns)
+
+    @property
+    def rate(self):
+        """
+        The rows written per second.
+        """
+        return self.rows / self.elapsed if self.elapsed else 0.0
+
+    def _prepare(self, columns):
+        if not hasattr(columns, 'items'):
+            columns = dict((column, '') for column in columns)
+        self._columns = list(columns)
+
+        self._connection.execute('CREATE TABLE IF NOT EXISTS %s (%s)' % (
+            _quote(self.table),
+            ', '.join(
+                ('%s %s' % (_quote(name), sqlite_type)).strip()
+                for name, sqlite_type in columns.items()
+            )
+        ))
+        statement = 'INSERT INTO %s (%s) VALUES (%s)' % (
+            _quote(self.table),
+            ', '.join(_quote(c) for c in self._columns),
+            ', '.join('?' for _ in self._columns)
+        )
+
+        if self.upsert_keys:
+            self._connection.execute(
+                'CREATE UNIQUE INDEX IF NOT EXISTS %s ON %s (%s)' % (
+                    _quote('%s_upsert' % self.table),
+                    _quote(self.table),
+                    ', '.join(_quote(k) for k in self.upsert_keys)
+                ))
+            updates = ', '.join(
+                '%s = excluded.%s' % (_quote(c), _quote(c))
+                for c in self._columns if c not in self.upsert_keys
+            )
+            statement += ' ON CONFLICT (%s) DO %s' % (
+                ', '.join(_quote(k) for k in self.upsert_keys),
+                'UPDATE SET %s' % updates if updates else 'NOTHING'
+            )
+        # The same statement string is reused by every executemany,
+        # so it's compiled once by the sqlite3 statement cache.
+        self._statement = statement
+
+    def write(self, ds):
+        """
+        Write an iterable of dictionaries, returning the sink.
+        """
+        for chunk in chunks(ds, self.batch_size):
+            if self._columns is None:
+                self._prepare(dict(
+                    (name, _sqlite_type(value))
+                    for name, value in chunk[0].items()
+                ))
+            columns = self._columns
+            rows = [tuple(d.get(c) for c in columns) for d in chunk]
+
+            start = default_timer()
+            self._connection.execute('BEGIN')
+            try:
+                self._connection.executemany(self._statement, rows)
+            except BaseException:
+                self._connection.execute('ROLLBACK')
+                raise
+            self._connection.execute('COMMIT')
+            self.elapsed += default_timer() - start
+            self.rows += len(rows)
+        return self
+
+    def close(self):
+        self._connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
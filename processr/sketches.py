@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+
+import hashlib
+import math
+
+
+##############################################################
+#                Probabilistic data structures               #
+##############################################################
+
+def fingerprint(value):
+    """
+    Return a 64 bit hash of `value`, built from its repr.
+    Unlike `hash`, it's stable across processes and runs.
+
+    >>> fingerprint(('the_answer', 42)) == fingerprint(('the_answer', 42))
+    True
+    """
+    digest = hashlib.blake2b(repr(value).encode('utf-8'), digest_size=8)
+    return int.from_bytes(digest.digest(), 'big')
+
+
+class HyperLogLog(object):
+    """
+    Estimate the number of distinct values in a stream using
+    2 ** precision bytes of memory. The standard error is about
+    1.04 / sqrt(2 ** precision), i.e. 1.6% with the default precision.
+
+    >>> hll = HyperLogLog()
+    >>> for value in range(1000):
+    ...     hll.add(value % 100)
+    >>> 95 <= hll.count() <= 105
+    True
+    """
+
+    def __init__(self, precision=12):
+        self.precision = precision
+        self._registers = bytearray(1 << precision)
+
+    def add(self, value):
+        h = fingerprint(value)
+        width = 64 - self.precision
+        index = h >> width
+        rank = width - (h & ((1 << width) - 1)).bit_length() + 1
+        if rank > self._registers[index]:
+            self._registers[index] = rank
+
+    def merge(self, other):
+        self._registers = bytearray(
+            max(a, b) for a, b in zip(self._registers, other._registers)
+        )
+
+    def count(self):
+        m = len(self._registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / sum(2.0 ** -r for r in self._registers)
+        zeros = self._registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            # Small range correction (linear counting)
+            estimate = m * math.log(m / zeros)
+        return int(round(estimate))
+
+
+class TDigest(object):
+    """
+    A merging t-digest, estimating quantiles of a stream of numbers
+    keeping at most about `compression` centroids. Estimates are more
+    accurate near the tails (e.g. the 1st or 99th percentile).
+
+    >>> digest = TDigest()
+    >>> for value in range(1001):
+    ...     digest.add(value)
+    >>> 490 <= digest.quantile(0.5) <= 510
+    True
+    """
+
+    def __init__(self, compression=100):
+        self.compression = compression
+        self.count = 0
+        self.min = None
+        self.max = None
+        self._centroids = []
+        self._buffer = []
+
+    def add(self, value, weight=1):
+        self._buffer.append((value, weight))
+        self.count += weight
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+        if len(self._buffer) >= 10 * self.compression:
+            self._compress()
+
+    def merge(self, other):
+        if not other.count:
+            return
+        self._buffer.extend(other._centroids)
+        self._buffer.extend(other._buffer)
+        self.count += other.count
+        self.min = other.min if self.min is None else min(self.min, other.min)
+        self.max = other.max if self.max is None else max(self.max, other.max)
+        self._compress()
+
+    def _compress(self):
+        if not self._buffer:
+            return
+        points = sorted(self._centroids + self._buffer)
+        self._buffer = []
+
+        total = self.count
+        centroids = []
+        cumulative = 0
+        k_start = self._scale(0)
+        mean, weight = points[0]
+        for point_mean, point_weight in points[1:]:
+            merged_weight = weight + point_weight
+            k_end = self._scale((cumulative + merged_weight) / total)
+            # A centroid may span at most 1 unit of the scale function.
+            if k_end - k_start <= 1:
+                mean += (point_mean - mean) * point_weight / merged_weight
+                weight = merged_weight
+            else:
+                centroids.append((mean, weight))
+                cumulative += weight
+                k_start = self._scale(cumulative / total)
+                mean, weight = point_mean, point_weight
+        centroids.append((mean, weight))
+        self._centroids = centroids
+
+    def _scale(self, q):
+        # The k1 scale function: small centroids near the tails.
+        q = min(max(q, 0), 1)
+        return self.compression / (2 * math.pi) * math.asin(2 * q - 1)
+
+    def quantile(self, q):
+        """
+        Return the estimated `q` quantile (0 <= q <= 1),
+        or None if no value was added.
+        """
+        self._compress()
+        if not self._centroids:
+            return None
+
+        target = q * self.count
+        # Interpolate between centroid centers, using min and max
+        # as the centers of the two extremes.
+        previous_mean, previous_center = self.min, 0
+        cumulative = 0
+        for mean, weight in self._centroids:
+            center = cumulative + weight / 2
+            if target < center:
+                fraction = (target - previous_center) / (
+                    center - previous_center)
+                return previous_mean + fraction * (mean - previous_mean)
+            previous_mean, previous_center = mean, center
+            cumulative += weight
+
+        if cumulative == previous_center:
+            return self.max
+        fraction = (target - previous_center) / (cumulative - previous_center)
+        return previous_mean + fraction * (self.max - previous_mean)
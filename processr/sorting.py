@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+
+import heapq
+import pickle
+import tempfile
+
+from processr.compat import abc
+from processr.utils import as_tuple, record_key, chunks
+
+
+def sort_key(key):
+    """
+    Return a function extracting the sort key of a dictionary: `key`
+    could be a field name, a list of field names or a callable.
+
+    >>> sort_key(('a', 'b'))({'a': 1, 'b': 2, 'c': 3})
+    (1, 2)
+    """
+    if isinstance(key, abc.Callable):
+        return key
+    keys = as_tuple(key)
+    return lambda d: record_key(d, keys)
+
+
+def _write_run(ds, tmp_dir, block_size):
+    run = tempfile.TemporaryFile(prefix='processr-sort-', dir=tmp_dir)
+    for block in chunks(ds, block_size):
+        pickle.dump(block, run, pickle.HIGHEST_PROTOCOL)
+    run.seek(0)
+    return run
+
+
+def _read_run(run):
+    while True:
+        try:
+            block = pickle.load(run)
+        except EOFError:
+            return
+        for d in block:
+            yield d
+
+
+def external_sort(ds, key, reverse=False, buffer_size=100000, tmp_dir=None,
+                  block_size=1000):
+    """
+    Lazily sort an iterable of dictionaries holding at most `buffer_size`
+    of them in memory: sorted runs are spilled to temporary files
+    (as pickled blocks of `block_size` dictionaries) and merged.
+    The sort is stable.
+
+    >>> list(external_sort([{'a': 2}, {'a': 1}, {'a': 3}], 'a', buffer_size=2))
+    [{'a': 1}, {'a': 2}, {'a': 3}]
+
+    :param ds: an iterable of dictionaries
+    :param key: a field name, a list of field names or a callable
+    :param reverse: sort in descending order
+    :param buffer_size: the number of dictionaries sorted in memory
+    :param tmp_dir: where temporary files are created
+    :param block_size: the number of dictionaries pickled together
+    :return: an iterator of dictionaries
+    """
+    key = sort_key(key)
+    runs = []
+    try:
+        for buffer in chunks(ds, buffer_size):
+            buffer.sort(key=key, reverse=reverse)
+            if len(buffer) < buffer_size:
+                # The last run doesn't need to be spilled
+                break
+            runs.append(_write_run(buffer, tmp_dir, block_size))
+            buffer = []
+        else:
+            buffer = []
+
+        if not runs:
+            for d in buffer:
+                yield d
+            return
+
+        merged = heapq.merge(
+            *([_read_run(run) for run in runs] + [iter(buffer)]),
+            key=key, reverse=reverse
+        )
+        for d in merged:
+            yield d
+    finally:
+        for run in runs:
+            run.close()
@@ -1,13 +1,19 @@
 # -*- coding: utf-8 -*-
 
-from __future__ import absolute_import
-
 import functools
+import re
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta, timezone
 
 from processr.compat import reduce
 
 from processr.compat import abc
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 
 ##############################################################
 #                 Field transformers & utils                 #
@@ -54,6 +60,272 @@ def apply_filter(fun):
     return _filter
 
 
+##############################################################
+#                      Value parsers                         #
+##############################################################
+
+class Parser(ABC):
+    """
+    A value transformer with a batch interface: call it on a value, or
+    call `many` on a list of values (e.g. a column). Null values are
+    replaced by `default`; values which can't be parsed raise ValueError
+    (or TypeError), unless `strict` is False, in which case they're
+    replaced by `default` too.
+
+    Subclasses must implement `parse`, and may implement `parse_many`:
+    a fast path for columns without null values, which raises ValueError
+    or TypeError on invalid ones. `many` falls back to parsing value by
+    value when the column contains null values, or the fast path fails.
+    """
+
+    def __init__(self, default=None, null_values=(None, ''), strict=True):
+        self.default = default
+        self.null_values = null_values
+        self.strict = strict
+
+    @abstractmethod
+    def parse(self, value):
+        """
+        Parse a (non null) value.
+        """
+
+    def parse_many(self, values):
+        raise ValueError
+
+    def __call__(self, value):
+        if value in self.null_values:
+            return self.default
+        try:
+            return self.parse(value)
+        except (ValueError, TypeError):
+            if self.strict:
+                raise
+            return self.default
+
+    def many(self, values):
+        """
+        Parse a list of values, returning a list.
+        """
+        if not any(null in values for null in self.null_values):
+            try:
+                return self.parse_many(values)
+            except (ValueError, TypeError):
+                pass
+        if not self.strict:
+            return [self(value) for value in values]
+        parse, null_values, default = self.parse, self.null_values, \
+            self.default
+        return [default if value in null_values else parse(value)
+                for value in values]
+
+
+class _NumberParser(Parser):
+
+    type = None
+    dtype = None
+    # Below this length, the NumPy conversion isn't worth its overhead
+    numpy_threshold = 64
+
+    def parse(self, value):
+        return self.type(value)
+
+    def parse_many(self, values):
+        if numpy is not None and len(values) >= self.numpy_threshold \
+                and all(type(value) is str for value in values):
+            # Raise ValueError on null and invalid values
+            return numpy.array(values).astype(self.dtype).tolist()
+        return list(map(self.type, values))
+
+
+class parse_int(_NumberParser):
+    """
+    Parse integers, e.g. from strings.
+
+    >>> parse_int(default=0).many(['1', ' 2', None, ''])
+    [1, 2, 0, 0]
+    """
+    type = int
+    dtype = 'int64'
+
+    def parse_many(self, values):
+        # NumPy would truncate float values and overflow on large ints
+        if numpy is not None and all(type(value) is str and
+                                     _INT_RE.match(value) for value in values):
+            return super(parse_int, self).parse_many(values)
+        return list(map(int, values))
+
+
+_INT_RE = re.compile(r'\s*[-+]?\d{1,18}\s*$')
+
+
+class parse_float(_NumberParser):
+    """
+    Parse floats, e.g. from strings.
+
+    >>> parse_float().many(['1.5', '2', None])
+    [1.5, 2.0, None]
+    """
+    type = float
+    dtype = 'float64'
+
+
+_TRUE = frozenset(['1', 'true', 't', 'yes', 'y', 'on'])
+_FALSE = frozenset(['0', 'false', 'f', 'no', 'n', 'off'])
+
+
+class parse_bool(Parser):
+    """
+    Parse booleans from strings like 'true'/'false', 'yes'/'no',
+    'on'/'off', '1'/'0' (case insensitive), bools and 0/1 ints.
+
+    >>> parse_bool().many(['Yes', 'off', True, 0, None])
+    [True, False, True, False, None]
+    """
+
+    def __init__(self, default=None, null_values=(None, ''), strict=True):
+        super(parse_bool, self).__init__(default, null_values, strict)
+        # The usual spellings, so that most values need a single lookup
+        self._values = {}
+        for values, parsed in ((_TRUE, True), (_FALSE, False)):
+            for value in values:
+                for spelling in (value, value.upper(), value.title()):
+                    self._values[spelling] = parsed
+        self._values.update({True: True, False: False})
+
+    def parse(self, value):
+        try:
+            return self._values[value]
+        except KeyError:
+            pass
+        if isinstance(value, str):
+            parsed = self._values.get(value.strip().lower())
+            if parsed is not None:
+                return parsed
+        raise ValueError('invalid boolean: %r' % (value, ))
+
+    def parse_many(self, values):
+        lookup = self._values
+        try:
+            return [lookup[value] for value in values]
+        except KeyError:
+            raise ValueError
+
+
+_ISO_DATETIME_RE = re.compile(
+    r'(?P<year>\d{4})-?(?P<month>\d\d)-?(?P<day>\d\d)'
+    r'(?:[T ](?P<hour>\d\d):?(?P<minute>\d\d)(?::?(?P<second>\d\d)'
+    r'(?:[.,](?P<fraction>\d+))?)?)?'
+    r'\s*(?P<tz>Z|[-+]\d\d(?::?\d\d)?)?$'
+)
+
+
+def _tzinfo(tz):
+    if tz is None:
+        return None
+    if tz == 'Z':
+        return timezone.utc
+    sign = -1 if tz[0] == '-' else 1
+    offset = tz[1:].replace(':', '')
+    minutes = int(offset[:2]) * 60 + int(offset[2:] or 0)
+    return timezone(sign * timedelta(minutes=minutes))
+
+
+def _parse_iso_datetime(value):
+    match = _ISO_DATETIME_RE.match(value.strip())
+    if match is None:
+        raise ValueError('invalid ISO 8601 datetime: %r' % (value, ))
+    fraction = (match.group('fraction') or '0')[:6]
+    return datetime(
+        int(match.group('year')), int(match.group('month')),
+        int(match.group('day')), int(match.group('hour') or 0),
+        int(match.group('minute') or 0), int(match.group('second') or 0),
+        int(fraction.ljust(6, '0')), _tzinfo(match.group('tz'))
+    )
+
+
+class parse_datetime(Parser):
+    """
+    Parse ISO 8601 datetimes (e.g. '2016-04-03T10:30:00Z' or the basic
+    format '20160403T103000+0200'). `datetime.fromisoformat` is tried
+    first, falling back to a regular expression for the formats it
+    doesn't support (depending on the Python version).
+
+    >>> parse_datetime()('20160403T1030')
+    datetime.datetime(2016, 4, 3, 10, 30)
+    """
+
+    def parse(self, value):
+        if isinstance(value, datetime):
+            return value
+        try:
+            return datetime.fromisoformat(value)
+        except ValueError:
+            return _parse_iso_datetime(value)
+
+    def parse_many(self, values):
+        return list(map(datetime.fromisoformat, values))
+
+
+class _StringParser(Parser):
+
+    method = None
+
+    def parse(self, value):
+        return self.method(value)
+
+    def parse_many(self, values):
+        return list(map(self.method, values))
+
+
+class strip(_StringParser):
+    """
+    Strip the leading and trailing whitespace of strings.
+
+    >>> strip().many([' a ', None])
+    ['a', None]
+    """
+    method = staticmethod(str.strip)
+
+
+class lower(_StringParser):
+    """
+    Lowercase strings.
+
+    >>> lower().many(['A', None])
+    ['a', None]
+    """
+    method = staticmethod(str.lower)
+
+
+class split(Parser):
+    """
+    Split strings on `sep` (a string, a compiled regular expression,
+    or None to split on whitespace), optionally stripping every item
+    and discarding the empty ones.
+
+    >>> split(',', strip=True).many(['a, b,', None])
+    [['a', 'b'], None]
+    """
+
+    def __init__(self, sep=None, maxsplit=-1, strip=False, default=None,
+                 null_values=(None, ''), strict=True):
+        super(split, self).__init__(default, null_values, strict)
+        self.sep = sep
+        self.maxsplit = maxsplit
+        self.strip = strip
+
+    def _split(self, value):
+        if self.sep is None or isinstance(self.sep, str):
+            return value.split(self.sep, self.maxsplit)
+        return self.sep.split(value, max(self.maxsplit, 0))
+
+    def parse(self, value):
+        if self.strip:
+            return [item for item in map(str.strip, self._split(value))
+                    if item]
+        return self._split(value)
+
+
 ##############################################################
 #                     Dict transformers                      #
 ##############################################################
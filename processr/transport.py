@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+
+import pickle
+import struct
+from array import array
+
+from multiprocessing import shared_memory
+
+
+##############################################################
+#                  Shared memory batch transport             #
+##############################################################
+#
+# A batch of records is serialized once in a single buffer:
+#
+#   | header size (8 bytes) | pickled header | column 1 | column 2 | ...
+#
+# When all the records share the same keys the batch is stored by
+# column (in the same key order): int and float columns are raw
+# int64/double arrays, other columns are pickled lists. Otherwise,
+# records are stored as a pickled list. Readers build new lists and
+# dictionaries from the buffer, so values are copied once on each side.
+# Only the (name, size) handle of the buffer crosses the process
+# boundary.
+
+_HEADER_SIZE = struct.Struct('<Q')
+_INT64_RANGE = (-2 ** 63, 2 ** 63)
+
+
+def _column_format(values):
+    types = set(map(type, values))
+    if types == {float}:
+        return 'd'
+    if types == {int}:
+        low, high = _INT64_RANGE
+        if low <= min(values) and max(values) < high:
+            return 'q'
+    return 'pickle'
+
+
+def encode(records):
+    """
+    Serialize a list of dictionaries, returning a (header, buffers)
+    tuple: the encoded batch is the concatenation of the two.
+    """
+    keys = tuple(records[0]) if records else ()
+    # Key order matters: decoded records must iterate like the original
+    columnar = all(tuple(record) == keys for record in records)
+
+    columns = []
+    buffers = []
+    offset = 0
+    if columnar:
+        for key in keys:
+            values = [record[key] for record in records]
+            column_format = _column_format(values)
+            if column_format == 'pickle':
+                buffer = pickle.dumps(values, pickle.HIGHEST_PROTOCOL)
+            else:
+                buffer = array(column_format, values).tobytes()
+            columns.append((key, column_format, offset, len(buffer)))
+            buffers.append(buffer)
+            offset += len(buffer)
+    else:
+        buffer = pickle.dumps(records, pickle.HIGHEST_PROTOCOL)
+        columns.append((None, 'pickle', 0, len(buffer)))
+        buffers.append(buffer)
+
+    header = pickle.dumps(
+        {'length': len(records), 'columnar': columnar, 'columns': columns},
+        pickle.HIGHEST_PROTOCOL
+    )
+    return _HEADER_SIZE.pack(len(header)) + header, buffers
+
+
+def encoded_size(header, buffers):
+    return len(header) + sum(len(buffer) for buffer in buffers)
+
+
+def decode(buf):
+    """
+    Deserialize a batch encoded by `encode` from a bytes-like object.
+    The returned dictionaries don't reference the buffer, which
+    can be released afterwards.
+    """
+    view = memoryview(buf)
+    try:
+        header_size, = _HEADER_SIZE.unpack_from(view)
+        start = _HEADER_SIZE.size + header_size
+        header = pickle.loads(view[_HEADER_SIZE.size:start])
+
+        if not header['columnar']:
+            _, _, offset, size = header['columns'][0]
+            return pickle.loads(view[start + offset:start + offset + size])
+
+        keys = []
+        columns = []
+        for key, column_format, offset, size in header['columns']:
+            column = view[start + offset:start + offset + size]
+            keys.append(key)
+            if column_format == 'pickle':
+                columns.append(pickle.loads(column))
+            else:
+                # Values are copied out of the buffer, without pickling
+                with column.cast(column_format) as values:
+                    columns.append(values.tolist())
+            # Views must be released before the shared memory is closed
+            column.release()
+
+        if not keys:
+            return [{} for _ in range(header['length'])]
+        return [dict(zip(keys, values)) for values in zip(*columns)]
+    finally:
+        view.release()
+
+
+def write_batch(records):
+    """
+    Encode a list of dictionaries in a new shared memory block,
+    returning its (name, size) handle. The block must be unlinked
+    by the reader (see `read_batch`).
+    """
+    header, buffers = encode(records)
+    size = encoded_size(header, buffers)
+    block = shared_memory.SharedMemory(create=True, size=max(size, 1))
+    try:
+        offset = 0
+        for chunk in [header] + buffers:
+            block.buf[offset:offset + len(chunk)] = chunk
+            offset += len(chunk)
+    finally:
+        block.close()
+    return block.name, size
+
+
+def read_batch(handle, unlink=False):
+    """
+    Decode the list of dictionaries in the shared memory block
+    identified by `handle`, optionally unlinking the block.
+    """
+    name, size = handle
+    block = shared_memory.SharedMemory(name=name)
+    try:
+        return decode(block.buf[:size])
+    finally:
+        block.close()
+        if unlink:
+            block.unlink()
+
+
+def unlink_batch(handle):
+    """
+    Release a shared memory block without reading it.
+    """
+    name, _ = handle
+    block = shared_memory.SharedMemory(name=name)
+    block.close()
+    block.unlink()
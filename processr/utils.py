@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+
+import os
+import pickle
+import tempfile
+from collections import OrderedDict
+from itertools import islice
+
+
+_MISSING = object()
+
+
+def as_tuple(keys):
+    """
+    Normalize a single key or a collection of keys to a tuple.
+
+    >>> as_tuple('the_answer')
+    ('the_answer',)
+    >>> as_tuple(['the', 'answer'])
+    ('the', 'answer')
+    """
+    if isinstance(keys, (tuple, list)):
+        return tuple(keys)
+    return (keys, )
+
+
+def record_key(d, keys):
+    """
+    Build the (tuple) key of a dictionary from the values of `keys`.
+    Raise KeyError if one of the keys isn't found.
+
+    >>> record_key({'a': 1, 'b': 2, 'c': 3}, ('a', 'c'))
+    (1, 3)
+    """
+    return tuple(d[key] for key in keys)
+
+
+def quote_identifier(name):
+    """
+    Quote a SQL identifier (e.g. a table or column name).
+
+    >>> print(quote_identifier('the_answer'))
+    "the_answer"
+    """
+    return '"%s"' % name.replace('"', '""')
+
+
+def chunks(iterable, size):
+    """
+    Lazily split an iterable in lists of (at most) `size` elements.
+
+    >>> list(chunks(range(5), 2))
+    [[0, 1], [2, 3], [4]]
+    """
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+class LRUCache(object):
+    """
+    A bounded mapping which evicts the least recently used item when
+    more than `maxsize` items are stored. Hits and misses are counted.
+
+    >>> cache = LRUCache(maxsize=1)
+    >>> cache['a'] = 1
+    >>> cache['b'] = 2
+    >>> cache.get('a') is None, cache.get('b')
+    (True, 2)
+    """
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+
+    def get(self, key, default=None):
+        value = self._data.pop(key, _MISSING)
+        if value is _MISSING:
+            self.misses += 1
+            return default
+        # Re-insert the item to mark it as the most recently used.
+        self._data[key] = value
+        self.hits += 1
+        return value
+
+    def __setitem__(self, key, value):
+        self._data.pop(key, None)
+        self._data[key] = value
+        if len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def __len__(self):
+        return len(self._data)
+
+    def clear(self):
+        self._data.clear()
+
+
+def atomic_dump(obj, path):
+    """
+    Pickle `obj` to `path` atomically: readers see either the previous
+    content of the file or the new one, never a partial write.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(prefix='.processr-', dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump(obj, f, pickle.HIGHEST_PROTOCOL)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+
+
+def load_dump(path):
+    """
+    Load an object pickled by `atomic_dump`.
+    """
+    with open(path, 'rb') as f:
+        return pickle.load(f)
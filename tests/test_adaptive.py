@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+
+from processr.adaptive import AdaptivePredicates
+from processr.processr import process_many
+from processr.transformers import set_value
+
+
+def slow_and_permissive(d):
+    sum(range(2000))
+    return True
+
+
+def fast_and_selective(d):
+    return d['the_answer'] % 10 == 0
+
+
+RECORDS = [{'the_answer': value} for value in range(5000)]
+
+
+def test_reorder():
+    predicates = AdaptivePredicates(
+        [slow_and_permissive, fast_and_selective],
+        sample_every=3, reorder_every=99
+    )
+
+    output = list(process_many(RECORDS, [('filter_records', predicates)]))
+    assert output == [d for d in RECORDS if d['the_answer'] % 10 == 0]
+    assert predicates.order == [1, 0]
+
+    stats = predicates.stats()
+    assert stats[0]['rejection_rate'] == 0
+    assert 0.8 < stats[1]['rejection_rate'] < 1
+
+
+def test_reorder_period():
+    predicates = AdaptivePredicates(
+        [slow_and_permissive, fast_and_selective],
+        sample_every=16, reorder_every=100
+    )
+
+    # Not a multiple of sample_every: reordered after 100 calls anyway
+    for d in RECORDS[:99]:
+        predicates(d)
+    assert predicates.order == [0, 1]
+    predicates(RECORDS[99])
+    assert predicates.order == [1, 0]
+
+
+def test_frozen():
+    predicates = AdaptivePredicates(
+        [slow_and_permissive, fast_and_selective],
+        sample_every=1, reorder_every=1, frozen=True
+    )
+
+    output = list(process_many(RECORDS, [('filter_records', predicates)]))
+    assert len(output) == 500
+    assert predicates.order == [0, 1]
+    assert predicates.stats()[0]['cost'] is None
+
+
+def test_freeze_learned_order():
+    predicates = AdaptivePredicates(
+        [slow_and_permissive, fast_and_selective],
+        sample_every=1, reorder_every=10
+    )
+    for d in RECORDS[:10]:
+        predicates(d)
+    predicates.freeze()
+
+    assert predicates.order == [1, 0]
+    restored = AdaptivePredicates(predicates.predicates,
+                                  order=predicates.order, frozen=True)
+    assert restored.order == [1, 0]
+
+
+def test_set_value_guard():
+    guard = AdaptivePredicates([lambda v: v > 0, lambda v: v % 2 == 0])
+
+    assert set_value({}, 'the_answer', 42, guard) == {'the_answer': 42}
+    assert set_value({}, 'the_answer', 43, guard) == {}
@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+
+from processr.aggregate import Aggregation, GroupTable, Count, Sum
+from processr.processr import process, process_many
+
+
+ORDERS = [
+    {'country': 'IT', 'amount': 10, 'user': 'a', 'ts': 0},
+    {'country': 'FR', 'amount': 5, 'user': 'b', 'ts': 3},
+    {'country': 'IT', 'amount': 30, 'user': 'a', 'ts': 7},
+    {'country': 'IT', 'amount': None, 'user': 'c', 'ts': 12},
+    {'country': 'FR', 'amount': 7, 'user': 'b', 'ts': 15},
+]
+
+
+def test_aggregation():
+    aggregation = Aggregation(
+        group_by='country',
+        metrics={
+            'orders': ('count', None),
+            'amounts': ('count', 'amount'),
+            'total': ('sum', 'amount'),
+            'min': ('min', 'amount'),
+            'max': ('max', 'amount'),
+            'mean': ('mean', 'amount'),
+            'users': ('distinct', 'user'),
+            'median': ('quantile', 'amount', 0.5),
+        }
+    )
+    expected_output = [
+        {'country': 'IT', 'orders': 3, 'amounts': 2, 'total': 40, 'min': 10,
+         'max': 30, 'mean': 20, 'users': 2, 'median': 20},
+        {'country': 'FR', 'orders': 2, 'amounts': 2, 'total': 12, 'min': 5,
+         'max': 7, 'mean': 6, 'users': 1, 'median': 6},
+    ]
+
+    output = aggregation.process_many(ORDERS)
+    assert list(output) == expected_output
+
+
+def test_tumbling_window():
+    aggregation = Aggregation(
+        metrics={'total': ('sum', 'amount')},
+        window_key='ts', window_size=10
+    )
+    expected_output = [
+        {'window_start': 0, 'window_end': 10, 'total': 45},
+        {'window_start': 10, 'window_end': 20, 'total': 7},
+    ]
+
+    output = aggregation.process_many(ORDERS)
+    # The first window is emitted before the stream is exhausted
+    assert next(output) == expected_output[0]
+    assert [expected_output[0]] + list(output) == expected_output
+
+
+def test_sliding_window():
+    aggregation = Aggregation(
+        metrics={'orders': ('count', None)},
+        window_key='ts', window_size=10, window_slide=5
+    )
+    expected_output = [
+        {'window_start': -5, 'window_end': 5, 'orders': 2},
+        {'window_start': 0, 'window_end': 10, 'orders': 3},
+        {'window_start': 5, 'window_end': 15, 'orders': 2},
+        {'window_start': 10, 'window_end': 20, 'orders': 2},
+        {'window_start': 15, 'window_end': 25, 'orders': 1},
+    ]
+
+    output = aggregation.process_many(ORDERS)
+    assert list(output) == expected_output
+
+
+def test_window_late_records():
+    aggregation = Aggregation(
+        metrics={'orders': ('count', None)},
+        window_key='ts', window_size=10
+    )
+    late = {'ts': 1}
+
+    output = list(aggregation.process_many(ORDERS[:4] + [late]))
+    assert output[0] == {'window_start': 0, 'window_end': 10, 'orders': 3}
+    assert aggregation.late == 1
+
+
+def test_group_table_spill(tmpdir):
+    table = GroupTable(lambda: [Count(), Sum()], max_groups=10,
+                       spill_dir=str(tmpdir))
+    for value in range(1000):
+        count, total = table.aggregators((value % 25, ))
+        count.add(value)
+        total.add(value)
+
+    assert len(table) <= 10
+    assert table.spills > 0
+
+    output = dict(
+        (key, (count.result(), total.result()))
+        for key, (count, total) in table.drain()
+    )
+    assert len(output) == 25
+    assert output[(0, )] == (40, sum(range(0, 1000, 25)))
+    assert tmpdir.listdir() == []
+
+
+def test_group_table_spill_equal_keys(tmpdir):
+    table = GroupTable(lambda: [Count()], max_groups=1,
+                       spill_dir=str(tmpdir))
+    for key in [(1, ), (1.0, ), (True, ), (2, )]:
+        count, = table.aggregators(key)
+        count.add(1)
+
+    output = dict((key, count.result()) for key, (count, ) in table.drain())
+    assert output == {(1, ): 3, (2, ): 1}
+
+
+def test_aggregate_stage():
+    pipeline = [
+        ('aggregate', Aggregation('country', {'total': ('sum', 'amount')}))
+    ]
+
+    output = process_many(ORDERS, pipeline)
+    assert list(output) == [
+        {'country': 'IT', 'total': 40}, {'country': 'FR', 'total': 12}
+    ]
+
+
+def test_aggregate_stage_single_record():
+    pipeline = [('aggregate', Aggregation())]
+
+    with pytest.raises(TypeError):
+        process(ORDERS[0], pipeline)
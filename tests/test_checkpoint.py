@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+
+from processr.aggregate import Aggregation
+from processr.checkpoint import Checkpoint, checkpointed_process
+from processr.dedupe import ExactFilter
+
+
+RECORDS = [{'id': i % 40, 'amount': i} for i in range(100)]
+
+
+class Crash(Exception):
+    pass
+
+
+def build_job(path):
+    duplicate_filter = ExactFilter()
+    aggregation = Aggregation(metrics={'total': ('sum', 'amount'),
+                                       'records': ('count', None)})
+    checkpoint = Checkpoint(
+        path, state={'dedupe': duplicate_filter, 'aggregation': aggregation},
+        every=10
+    )
+    pipeline = [('dedupe', {'keys': 'id', 'filter': duplicate_filter})]
+    return checkpoint, pipeline, aggregation
+
+
+def test_resume(tmpdir):
+    path = str(tmpdir.join('job.checkpoint'))
+    committed = []
+
+    def crashing_source(offset):
+        for d in RECORDS[offset:]:
+            if d['amount'] == 25:
+                raise Crash
+            yield d
+
+    checkpoint, pipeline, aggregation = build_job(path)
+    with pytest.raises(Crash):
+        for output in aggregation.process_many(checkpointed_process(
+                crashing_source, pipeline, checkpoint,
+                commit=committed.append)):
+            pass
+    assert committed == [10, 20]
+
+    # A new process restores the state of the last checkpoint
+    checkpoint, pipeline, aggregation = build_job(path)
+    output = list(aggregation.process_many(checkpointed_process(
+        lambda offset: iter(RECORDS[offset:]), pipeline, checkpoint,
+        commit=committed.append)))
+
+    assert output == [{'total': sum(range(40)), 'records': 40}]
+    assert checkpoint.offset == 100
+    assert checkpoint.watermark == 40
+    assert committed == [10, 20, 30] + [40] * 7
+
+
+def test_resume_iterable(tmpdir):
+    path = str(tmpdir.join('job.checkpoint'))
+    checkpoint = Checkpoint(path, every=30)
+    pipeline = [('rename_keys', {'id': 'record_id'})]
+
+    outputs = checkpointed_process(RECORDS, pipeline, checkpoint)
+    first = [next(outputs) for _ in range(45)]
+    outputs.close()  # the job stops after the checkpoint at offset 30
+
+    checkpoint = Checkpoint(path, every=30)
+    rest = list(checkpointed_process(RECORDS, pipeline, checkpoint))
+    assert first[:30] + rest == [{'record_id': d['id'], 'amount': d['amount']}
+                                 for d in RECORDS]
+
+    checkpoint.clear()
+    assert tmpdir.listdir() == []
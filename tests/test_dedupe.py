@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+
+from processr.dedupe import ExactFilter, BloomFilter
+from processr.processr import process, process_many, DROPPED
+
+
+RECORDS = [
+    {'id': 1, 'source': 'a'},
+    {'id': 2, 'source': 'a'},
+    {'id': 1, 'source': 'b'},
+    {'id': 1, 'source': 'a'},
+]
+
+
+def test_exact_filter():
+    duplicate_filter = ExactFilter()
+    pipeline = [('dedupe', {'keys': ('id', 'source'),
+                            'filter': duplicate_filter})]
+
+    output = process_many(RECORDS, pipeline)
+    assert list(output) == RECORDS[:3]
+    assert duplicate_filter.dropped == 1
+    assert duplicate_filter.checked == 4
+
+
+def test_exact_filter_bounded():
+    duplicate_filter = ExactFilter(maxsize=1)
+
+    assert not duplicate_filter.check((1, ))
+    assert not duplicate_filter.check((2, ))
+    # (1, ) was evicted
+    assert not duplicate_filter.check((1, ))
+
+
+def test_bloom_filter():
+    duplicate_filter = BloomFilter(capacity=10000, error_rate=0.01)
+    pipeline = [('dedupe', {'keys': 'id', 'filter': duplicate_filter})]
+    records = [{'id': i % 10000} for i in range(20000)]
+
+    output = list(process_many(records, pipeline))
+    # False positives drop some unique records, too
+    assert 9800 < len(output) <= 10000
+    assert duplicate_filter.dropped == 20000 - len(output)
+
+
+def test_filter_persistence(tmpdir):
+    path = str(tmpdir.join('filter.pickle'))
+    duplicate_filter = BloomFilter(capacity=100)
+    duplicate_filter.check((42, ))
+    duplicate_filter.save(path)
+
+    loaded = BloomFilter.load(path)
+    assert loaded.check((42, ))
+    assert loaded.checked == 2
+
+    with pytest.raises(TypeError):
+        ExactFilter.load(path)
+
+
+def test_dedupe_single_record():
+    pipeline = [('dedupe', {'keys': 'id', 'filter': ExactFilter()})]
+
+    assert process(RECORDS[0], pipeline) == RECORDS[0]
+    assert process(RECORDS[2], pipeline) is DROPPED
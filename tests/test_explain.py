@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+
+from processr.aggregate import Aggregation
+from processr.dedupe import ExactFilter
+from io import StringIO
+from processr.explain import explain, analyze, normalize, plan
+from processr.processr import InvalidTransformerFormat, process_many
+
+
+def double(value):
+    return value * 2
+
+
+PIPELINE = [
+    ('filter_records', lambda d: d['id'] % 2),
+    ('transform_values', {'value': [double, (round, {'ndigits': 1})]}),
+    ('rename_keys', {'id': 'record_id'}),
+    ('aggregate', Aggregation('record_id', {'total': ('sum', 'value')})),
+]
+
+
+def test_normalize():
+    assert normalize(double) == ['tests.test_explain.double']
+    assert normalize([double, [(round, {'ndigits': 1})]]) == [
+        'tests.test_explain.double', 'builtins.round(ndigits=1)'
+    ]
+    with pytest.raises(InvalidTransformerFormat):
+        normalize(42)
+
+
+def test_plan():
+    stages = plan(PIPELINE, keys=['id', 'value'])
+
+    assert [s['mode'] for s in stages] == [
+        'batch', 'shape plan', 'shape plan', 'batch'
+    ]
+    assert stages[1]['transformers'] == [
+        ('value', ['tests.test_explain.double', 'builtins.round(ndigits=1)'])
+    ]
+    assert [s['keys'] for s in stages] == [
+        ['id', 'value'], ['id', 'value'], ['record_id', 'value'],
+        ['record_id', 'total'],
+    ]
+    assert [s['copies'] for s in stages] == [0, 1, 1, 0]
+
+
+def test_plan_unknown_keys():
+    stages = plan([('transform_dict', double), ('rename_keys', {'a': 'b'}),
+                   ('project_dict', ['b'])])
+
+    assert [s['keys'] for s in stages] == [None, None, ['b']]
+    assert stages[0]['copies'] is None
+
+
+def test_plan_unknown_stage():
+    with pytest.raises(KeyError):
+        plan([('not_a_stage', None)])
+
+
+def test_explain():
+    output = StringIO()
+    explain(PIPELINE, keys=['id', 'value'], file=output)
+
+    lines = output.getvalue().splitlines()
+    assert lines[0] == "input keys: ['id', 'value']"
+    assert lines[-1] == 'dict copies per record: 2'
+    assert "    ['value'] tests.test_explain.double | " \
+           "builtins.round(ndigits=1)" in lines
+
+
+def test_analyze():
+    output = StringIO()
+    records = [{'id': i, 'value': i} for i in range(10)]
+    measures = analyze(PIPELINE, records, file=output)
+
+    assert [m['stage'] for m in measures] == [s for s, _ in PIPELINE]
+    assert [(m['records_in'], m['records_out']) for m in measures] == [
+        (10, 5), (5, 5), (5, 5), (5, 5)
+    ]
+    assert measures[0]['selectivity'] == 0.5
+    assert all(m['seconds'] >= 0 for m in measures)
+    assert [t['calls'] for t in measures[1]['transformers'].values()] \
+        == [5, 5]
+    assert '10 -> 5 records (50%)' in output.getvalue()
+    assert '(5 calls, ' in output.getvalue()
+
+
+def make_padding(value):
+    return [str(i) * 1000 for i in range(10)] and value
+
+
+def test_analyze_memory():
+    pipeline = [('transform_values', {'value': make_padding})]
+    records = [{'id': i, 'value': i} for i in range(10)]
+
+    measure, = analyze(pipeline, records, file=StringIO())
+    assert measure['copied']
+    assert measure['peak_bytes'] > 10 * 1000
+    assert measure['retained_bytes'] >= 0
+    padding, = measure['transformers'].values()
+    assert padding['calls'] == 10
+    assert padding['allocated_bytes'] > 10 * 10 * 1000
+
+
+def test_analyze_copies_stage_options():
+    dedupe_filter = ExactFilter()
+    aggregation = Aggregation((), {'count': ('count', None)},
+                              window_key='id', window_size=2)
+    pipeline = [
+        ('dedupe', {'keys': 'id', 'filter': dedupe_filter}),
+        ('aggregate', aggregation),
+    ]
+    records = [{'id': i} for i in range(10)]
+
+    analyze(pipeline, records, file=StringIO())
+    assert dedupe_filter.checked == 0
+    output = list(process_many(records, pipeline))
+    assert len(output) == 5
+    assert aggregation.late == 0
+
+
+class Uncopyable(object):
+
+    def __deepcopy__(self, memo):
+        raise TypeError('not copyable')
+
+    def __call__(self, d):
+        return True
+
+
+def test_analyze_uncopyable_options():
+    output = StringIO()
+    measure, = analyze([('filter_records', Uncopyable())], [{'id': 1}],
+                       file=output)
+    assert not measure['copied']
+    assert measure['peak_bytes'] is None
+    assert 'not copied' in output.getvalue()
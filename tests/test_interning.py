@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+
+import json
+
+from processr.interning import InternPool
+from processr.processr import process, process_many
+
+
+def test_intern_pool():
+    pool = InternPool()
+    first, second = json.loads('["Italy", "Italy"]')
+    assert first is not second
+
+    assert pool.intern(first) is first
+    assert pool.intern(second) is first
+    assert pool.interned == 1
+    assert pool.saved_bytes > 0
+
+
+def test_intern_pool_types():
+    pool = InternPool()
+
+    assert pool.intern(1) == 1
+    assert pool.intern(True) is True
+    assert pool.intern(1.0) == 1.0 and type(pool.intern(1.0)) is float
+
+
+def test_intern_pool_unhashable():
+    pool = InternPool()
+    value = [1, 2]
+
+    assert pool.intern(value) is value
+    assert len(pool) == 0
+
+
+def test_intern_pool_bounded():
+    pool = InternPool(maxsize=2)
+    for value in range(10):
+        pool.intern(str(value))
+
+    assert len(pool) == 2
+
+
+def test_intern_values_stage():
+    pool = InternPool()
+    records = [json.loads('{"country": "Italy", "id": %d}' % i)
+               for i in range(10)]
+    pipeline = [('intern_values', {'pool': pool, 'fields': ('country', )})]
+
+    output = list(process_many(records, pipeline))
+    assert output == records
+    assert all(d['country'] is output[0]['country'] for d in output)
+    assert all(list(d)[0] is list(output[0])[0] for d in output)
+    # 9 'country' values, 9 'country' keys and 9 'id' keys
+    assert pool.interned == 27
+
+
+def test_intern_values_single_field():
+    pool = InternPool()
+    canonical = pool.intern(''.join(['It', 'aly']))
+    pipeline = [('intern_values', {'pool': pool, 'fields': 'country'})]
+
+    d = {'country': ''.join(['Ita', 'ly']), 'c': ''.join(['Ital', 'y'])}
+    output = process(d, pipeline)
+    assert output['country'] is canonical
+    # 'c' is a substring of 'country', but not one of the fields
+    assert output['c'] is d['c']
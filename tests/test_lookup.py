@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+
+from processr.lookup import HashIndex, SortedIndex, SQLiteIndex
+
+
+RECORDS = [
+    {'code': 'IT', 'year': 2016, 'name': 'Italy'},
+    {'code': 'FR', 'year': 2016, 'name': 'France'},
+    {'code': 'IT', 'year': 1946, 'name': 'Repubblica Italiana'},
+]
+
+
+def test_hash_index_multiple_keys():
+    index = HashIndex(RECORDS, ('code', 'year'))
+
+    assert index.get(('IT', 1946))['name'] == 'Repubblica Italiana'
+    assert index.get(('DE', 2016)) is None
+
+
+def test_hash_index_get_many():
+    index = HashIndex(RECORDS, 'name')
+
+    output = index.get_many([('Italy', ), ('Germany', )])
+    assert output == {('Italy', ): RECORDS[0]}
+
+
+def test_sorted_index():
+    index = SortedIndex(RECORDS, 'year')
+
+    assert index.get((1946, )) == RECORDS[2]
+    assert index.get((1947, )) is None
+
+
+def test_sorted_index_floor():
+    index = SortedIndex(RECORDS, 'year', floor=True)
+
+    assert index.get((1990, )) == RECORDS[2]
+    assert index.get((1900, )) is None
+
+
+def test_sorted_index_range():
+    index = SortedIndex(RECORDS, 'year')
+
+    assert index.range((1900, ), (2000, )) == [RECORDS[2]]
+
+
+def test_sqlite_index(tmpdir):
+    path = str(tmpdir.join('lookup.db'))
+    index = SQLiteIndex.build(path, 'countries', RECORDS, ('code', 'year'))
+
+    output = index.get_many([('IT', 1946), ('FR', 2016), ('DE', 2016)])
+    assert output == {('IT', 1946): RECORDS[2], ('FR', 2016): RECORDS[1]}
+    assert index.cache.misses == 3
+
+    # Both hits and misses are now served by the cache
+    assert index.get(('DE', 2016)) is None
+    assert index.get(('IT', 1946)) == RECORDS[2]
+    assert index.cache.hits == 2
+    index.close()
+
+
+def test_sqlite_index_single_key(tmpdir):
+    path = str(tmpdir.join('lookup.db'))
+    index = SQLiteIndex.build(path, 'countries', RECORDS[:2], 'code')
+
+    assert index.get(('FR', )) == RECORDS[1]
+    index.close()
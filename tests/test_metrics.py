@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+
+import threading
+
+import pytest
+
+from processr.aggregate import Aggregation
+from processr.metrics import Metrics, prometheus_text, serve
+from processr.processr import process, process_many, DROPPED
+
+from urllib.error import HTTPError
+from urllib.request import urlopen
+
+
+def check_positive(value):
+    if value < 0:
+        raise ValueError(value)
+    return value
+
+
+PIPELINE = [
+    ('filter_records', lambda d: d['value'] % 3),
+    ('transform_values', {'value': check_positive}),
+    ('rename_keys', {'value': 'the_answer'}),
+]
+
+
+def run(metrics, values):
+    for value in values:
+        try:
+            process({'value': value}, PIPELINE, metrics=metrics)
+        except ValueError:
+            pass
+
+
+def test_process_metrics():
+    metrics = Metrics(sample_rate=0.5)
+    run(metrics, [1, 2, 3, -1, 4, 6])
+
+    snapshot = metrics.snapshot()
+    assert (snapshot['records'], snapshot['outputs'], snapshot['dropped'],
+            snapshot['errors']) == (6, 3, 2, 1)
+    assert snapshot['error_rate'] == pytest.approx(1 / 6.0)
+    # Every other record is sampled: 2, -1 (which raises) and 6
+    assert snapshot['latency']['count'] == 2
+    assert snapshot['latency']['buckets'][-1] == (float('inf'), 2)
+
+    stages = snapshot['stages']
+    assert list(stages) == [
+        '0 filter_records', '1 transform_values', '2 rename_keys'
+    ]
+    assert [(s['calls'], s['outputs'], s['dropped'], s['errors'])
+            for s in stages.values()] == [
+        (6, 4, 2, 0), (4, 3, 0, 1), (3, 3, 0, 0)
+    ]
+    assert stages['0 filter_records']['latency']['count'] == 3
+    assert stages['2 rename_keys']['latency']['count'] == 1
+
+
+def test_process_output_unchanged():
+    metrics = Metrics(sample_rate=1)
+
+    assert process({'value': 1}, PIPELINE, metrics=metrics) == \
+        {'the_answer': 1}
+    assert process({'value': 3}, PIPELINE, metrics=metrics) is DROPPED
+
+
+def test_metrics_per_thread():
+    metrics = Metrics(sample_rate=0)
+    threads = [
+        threading.Thread(target=run, args=(metrics, range(1, 1001)))
+        for _ in range(4)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    snapshot = metrics.snapshot()
+    assert snapshot['records'] == 4000
+    assert snapshot['dropped'] == 4 * 333
+    assert snapshot['latency']['count'] == 0
+
+
+def test_process_many_metrics():
+    metrics = Metrics(sample_rate=0.5)
+    pipeline = PIPELINE + [
+        ('aggregate', Aggregation((), {'count': ('count', None)}))
+    ]
+
+    output = process_many([{'value': v} for v in range(1, 11)], pipeline,
+                          metrics=metrics)
+    assert list(output) == [{'count': 7}]
+
+    snapshot = metrics.snapshot()
+    assert (snapshot['records'], snapshot['outputs'], snapshot['dropped']) \
+        == (10, 1, 9)
+    assert [(s['calls'], s['outputs'])
+            for s in snapshot['stages'].values()] == [
+        (10, 7), (7, 7), (7, 7), (7, 1)
+    ]
+    assert snapshot['stages']['1 transform_values']['latency']['count'] == 3
+
+
+def test_process_many_batch_stage_first():
+    metrics = Metrics(sample_rate=1)
+    pipeline = [
+        ('aggregate', Aggregation('group', {'count': ('count', None)})),
+        ('rename_keys', {'count': 'total'}),
+    ]
+
+    output = process_many([{'group': v % 3} for v in range(1, 11)],
+                          pipeline, metrics=metrics)
+    assert sorted(d['total'] for d in output) == [3, 3, 4]
+
+    snapshot = metrics.snapshot()
+    assert (snapshot['records'], snapshot['outputs'], snapshot['dropped']) \
+        == (10, 3, 7)
+    assert [(s['calls'], s['outputs'], s['dropped'])
+            for s in snapshot['stages'].values()] == [
+        (10, 3, 7), (3, 3, 0)
+    ]
+    assert snapshot['latency']['count'] == 3
+
+
+def test_process_many_errors():
+    metrics = Metrics()
+    output = process_many([{'value': 1}, {'value': -1}], PIPELINE,
+                          metrics=metrics)
+
+    with pytest.raises(ValueError):
+        list(output)
+    snapshot = metrics.snapshot()
+    assert snapshot['errors'] == 1
+    assert snapshot['stages']['1 transform_values']['errors'] == 1
+
+
+def test_single_pipeline():
+    metrics = Metrics()
+    process({'value': 1}, PIPELINE, metrics=metrics)
+
+    with pytest.raises(ValueError):
+        process({'value': 1}, PIPELINE[:1], metrics=metrics)
+
+
+def test_prometheus_text():
+    metrics = Metrics(name='ingest "main"', sample_rate=1)
+    run(metrics, [1, 3])
+
+    text = prometheus_text([metrics])
+    assert '# TYPE processr_records_total counter' in text
+    assert 'processr_records_total{pipeline="ingest \\"main\\""} 2' in text
+    assert 'processr_stage_dropped_total{pipeline="ingest \\"main\\"",' \
+           'stage="0 filter_records"} 1' in text
+    assert 'processr_latency_seconds_bucket{pipeline="ingest \\"main\\"",' \
+           'le="+Inf"} 2' in text
+    assert 'processr_latency_seconds_count{pipeline="ingest \\"main\\""} 2' \
+        in text
+
+
+def test_serve():
+    metrics = Metrics()
+    run(metrics, [1, 2])
+    server = serve([metrics], port=0)
+    try:
+        url = 'http://127.0.0.1:%d' % server.server_address[1]
+        response = urlopen(url + '/metrics')
+        assert response.headers['Content-Type'].startswith('text/plain')
+        assert 'processr_records_total{pipeline="pipeline"} 2' in \
+            response.read().decode('utf-8')
+        with pytest.raises(HTTPError):
+            urlopen(url + '/')
+    finally:
+        server.shutdown()
+        server.server_close()
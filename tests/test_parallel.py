@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+
+import os
+import threading
+
+import pytest
+
+from processr.parallel import parallel_process_many, partitioned_process_many
+from processr.processr import process_many
+from processr.transport import encode, decode
+
+
+RECORDS = [
+    {'id': i, 'score': i / 2.0, 'name': 'record-%d' % i, 'flag': i % 2 == 0}
+    for i in range(2500)
+]
+
+PIPELINE = [
+    ('filter_records', lambda d: d['id'] % 5 != 0),
+    ('transform_values', {'score': lambda value: value * 2}),
+    ('rename_keys', {'id': 'record_id'}),
+]
+
+
+def test_encode_columnar():
+    header, buffers = encode(RECORDS)
+    output = decode(header + b''.join(buffers))
+
+    assert output == RECORDS
+    assert type(output[0]['id']) is int
+    assert type(output[0]['flag']) is bool
+
+
+def test_encode_heterogeneous():
+    records = [{'a': 1}, {'b': 2.0}, {}]
+    header, buffers = encode(records)
+
+    assert decode(header + b''.join(buffers)) == records
+
+
+def test_encode_key_order():
+    records = [{'a': 1, 'b': 2}, {'b': 3, 'a': 4}]
+    header, buffers = encode(records)
+    output = decode(header + b''.join(buffers))
+
+    assert [list(d) for d in output] == [['a', 'b'], ['b', 'a']]
+
+
+@pytest.mark.parametrize('transport', ['shared_memory', 'pickle'])
+def test_parallel_key_order(transport):
+    records = [{'a': 1, 'b': 2}, {'b': 3, 'a': 4}]
+    pipeline = [('rename_keys', {'a': 'x', 'b': 'x'})]
+
+    output = parallel_process_many(records, pipeline, processes=1,
+                                   transport=transport)
+    assert list(output) == list(process_many(records, pipeline))
+
+
+@pytest.mark.parametrize('transport', ['auto', 'shared_memory', 'pickle'])
+def test_parallel_process_many(transport):
+    expected_output = [
+        {'record_id': d['id'], 'score': d['score'] * 2, 'name': d['name'],
+         'flag': d['flag']}
+        for d in RECORDS if d['id'] % 5 != 0
+    ]
+
+    output = parallel_process_many(
+        RECORDS, PIPELINE, processes=2, chunk_size=100, transport=transport
+    )
+    assert list(output) == expected_output
+
+
+def test_parallel_process_many_wide():
+    records = [dict(('metric_%d' % c, i * c) for c in range(40))
+               for i in range(300)]
+    pipeline = [('transform_values', {'metric_1': str})]
+
+    output = parallel_process_many(records, pipeline, processes=2,
+                                   chunk_size=100)
+    assert list(output) == list(process_many(records, pipeline))
+
+
+def running_total():
+    totals = {}
+
+    def _running_total(d):
+        totals[d['user']] = totals.get(d['user'], 0) + d['amount']
+        return dict(d, total=totals[d['user']])
+    return _running_total
+
+
+EVENTS = [{'user': i % 7, 'amount': i, 'seq': i} for i in range(500)]
+
+
+@pytest.mark.parametrize('ordered', [True, False])
+def test_partitioned_process_many(ordered):
+    pipeline = [
+        ('filter_records', lambda d: d['seq'] % 10 != 0),
+        ('transform_dict', running_total()),
+    ]
+    expected_output = list(process_many(EVENTS, pipeline))
+
+    output = list(partitioned_process_many(
+        EVENTS, [('filter_records', lambda d: d['seq'] % 10 != 0),
+                 ('transform_dict', running_total())],
+        key='user', partitions=3, chunk_size=16, ordered=ordered
+    ))
+    if ordered:
+        assert output == expected_output
+    else:
+        assert sorted(output, key=lambda d: d['seq']) == expected_output
+
+
+def test_partitioned_process_many_equal_keys():
+    events = [{'user': user, 'amount': i, 'seq': i}
+              for i, user in enumerate([1, 1.0, True, 2] * 10)]
+    pipeline = [('transform_dict', running_total())]
+    expected_output = list(process_many(events, pipeline))
+
+    output = partitioned_process_many(
+        events, [('transform_dict', running_total())], key='user',
+        partitions=4, chunk_size=8, ordered=True
+    )
+    assert list(output) == expected_output
+
+
+def test_partitioned_process_many_error():
+    pipeline = [('project_dict', ('missing', ))]
+
+    with pytest.raises(KeyError):
+        list(partitioned_process_many(EVENTS, pipeline, key='user',
+                                      partitions=2))
+
+
+class UnpicklableError(Exception):
+
+    def __init__(self):
+        super(UnpicklableError, self).__init__(threading.Lock())
+
+
+def raise_unpicklable(d):
+    raise UnpicklableError()
+
+
+@pytest.mark.parametrize('transformer, error', [
+    # Outputs which can't be pickled
+    (lambda d: dict(d, lock=threading.Lock()), TypeError),
+    (raise_unpicklable, RuntimeError),
+    # A worker exiting without replying
+    (lambda d: os._exit(0), RuntimeError),
+])
+def test_partitioned_process_many_worker_failures(transformer, error):
+    pipeline = [('transform_dict', transformer)]
+
+    with pytest.raises(error):
+        list(partitioned_process_many(EVENTS, pipeline, key='user',
+                                      partitions=2))
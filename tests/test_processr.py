@@ -1,6 +1,11 @@
 # -*- coding: utf-8 -*-
 
-from processr.processr import process
+import sys
+
+import pytest
+
+from processr.processr import (process, process_many, StageDefinitions,
+                               ShapeCache, DROPPED, discover_stages)
 
 
 def test_rename():
@@ -23,3 +28,168 @@ def test_rename_revert():
 
     output = process(provided_input, pipeline)
     assert output == provided_input
+
+
+def test_process_many():
+    provided_input = [{'the_answer': 42}, {'the_answer': 43}]
+    expected_output = [{'not_the_answer': 42}, {'not_the_answer': 43}]
+    pipeline = [
+        ('rename_keys', {'the_answer': 'not_the_answer'})
+    ]
+
+    output = process_many(provided_input, pipeline)
+    assert list(output) == expected_output
+
+
+def test_process_many_batch_handler():
+    def batch_handler(ds, stage_opts):
+        return ({'batch': d} for d in ds)
+
+    def record_handler(d, stage_opts):
+        raise AssertionError('the batch handler should be used')
+
+    record_handler.process_many = batch_handler
+    stage_definitions = StageDefinitions()
+    stage_definitions['wrap'] = record_handler
+
+    output = process_many(
+        [{'the_answer': 42}], [('wrap', None)], stage_definitions
+    )
+    assert list(output) == [{'batch': {'the_answer': 42}}]
+
+
+def test_process_many_shape_cache():
+    provided_input = [
+        {'the_answer': 41, 'question': None},
+        {'the_answer': 42},
+        {'the_answer': 43, 'question': None},
+    ]
+    expected_output = [
+        {'not_the_answer': '41'},
+        {'not_the_answer': '42'},
+        {'not_the_answer': '43'},
+    ]
+    pipeline = [
+        ('transform_values', {'the_answer': str}),
+        ('rename_keys', {'the_answer': 'not_the_answer'}),
+        ('project_dict', ('not_the_answer', ))
+    ]
+    shape_cache = ShapeCache()
+
+    output = process_many(provided_input, pipeline, shape_cache=shape_cache)
+    assert list(output) == expected_output
+    # 2 shapes for each one of the 3 stages; the last record
+    # has the same shape of the first one.
+    assert shape_cache.misses == 3 * 2
+    assert shape_cache.hits == 3 * 1
+
+
+def test_process_many_shape_cache_key_order():
+    # Plans depend on the key order: renamed keys collide here
+    provided_input = [{'a': 1, 'b': 2}, {'b': 2, 'a': 1}]
+    pipeline = [('rename_keys', {'a': 'x', 'b': 'x'})]
+
+    expected_output = [process(d, pipeline) for d in provided_input]
+    assert expected_output == [{'x': 2}, {'x': 1}]
+    assert list(process_many(provided_input, pipeline)) == expected_output
+
+
+def test_process_many_shape_cache_strict_key_order():
+    provided_input = [{'a': 1, 'b': 2, 'c': 3}, {'c': 3, 'b': 2, 'a': 1}]
+    pipeline = [('transform_values_strict', {'b': str, 'a': str})]
+
+    output = list(process_many(provided_input, pipeline))
+    for d, plan_output in zip(provided_input, output):
+        generic_output = process(d, pipeline)
+        assert plan_output == generic_output
+        assert list(plan_output) == list(generic_output)
+
+
+def test_process_shape_cache_bounded():
+    pipeline = [('rename_keys', {'the_answer': 'not_the_answer'})]
+    shape_cache = ShapeCache(maxsize=1)
+
+    process({'the_answer': 42}, pipeline, shape_cache=shape_cache)
+    process({'the_answer': 42, 'a': 1}, pipeline, shape_cache=shape_cache)
+    output = process({'the_answer': 42}, pipeline, shape_cache=shape_cache)
+
+    assert output == {'not_the_answer': 42}
+    assert len(shape_cache) == 1
+    assert shape_cache.misses == 3
+
+
+def test_process_shape_cache_projection_ko():
+    pipeline = [('project_dict', ('the_answer', ))]
+
+    with pytest.raises(KeyError):
+        process({'not_the_answer': 43}, pipeline, shape_cache=ShapeCache())
+
+
+def test_process_dropped_short_circuit():
+    def boom(d):
+        raise AssertionError('stages after a drop must not run')
+
+    pipeline = [
+        ('filter_records', lambda d: d['the_answer'] == 42),
+        ('transform_dict', boom)
+    ]
+
+    output = process({'the_answer': 54}, pipeline)
+    assert output is DROPPED
+
+
+def test_process_many_dropped():
+    provided_input = [{'the_answer': 42}, {'the_answer': 54}, {'nope': 0}]
+    pipeline = [
+        ('filter_records', lambda d: 'the_answer' in d),
+        # A transform_dict transformer can drop records, too
+        ('transform_dict', lambda d: DROPPED if d['the_answer'] > 50 else d),
+        ('rename_keys', {'the_answer': 'not_the_answer'})
+    ]
+
+    output = process_many(provided_input, pipeline)
+    assert list(output) == [{'not_the_answer': 42}]
+
+
+@pytest.fixture
+def plugin_path(tmp_path):
+    # A distribution registering a stage, whose module records its import
+    dist_info = tmp_path / 'processr_plugin-0.1.dist-info'
+    dist_info.mkdir()
+    (dist_info / 'METADATA').write_text(
+        u'Metadata-Version: 2.1\nName: processr-plugin\nVersion: 0.1\n')
+    (dist_info / 'entry_points.txt').write_text(
+        u'[processr.stages]\nshout = processr_plugin_stages:shout\n')
+    (tmp_path / 'processr_plugin_stages.py').write_text(
+        u'IMPORTS = []\nIMPORTS.append(1)\n\n'
+        u'def shout(d, stage_opts):\n'
+        u'    return dict((k, v.upper()) for k, v in d.items())\n')
+
+    sys.path.insert(0, str(tmp_path))
+    discover_stages(refresh=True)
+    yield tmp_path
+    sys.path.remove(str(tmp_path))
+    sys.modules.pop('processr_plugin_stages', None)
+    discover_stages(refresh=True)
+
+
+def test_discovered_stages_are_loaded_lazily(plugin_path):
+    assert 'shout' in discover_stages()
+    assert 'processr_plugin_stages' not in sys.modules
+
+    stage_definitions = StageDefinitions()
+    assert 'shout' not in stage_definitions
+    output = process({'a': 'b'}, [('shout', None)], stage_definitions)
+
+    assert output == {'a': 'B'}
+    plugin = sys.modules['processr_plugin_stages']
+    assert stage_definitions['shout'] is plugin.shout
+    process({'a': 'b'}, [('shout', None)], stage_definitions)
+    assert plugin.IMPORTS == [1]
+
+
+def test_discovery_can_be_disabled(plugin_path):
+    with pytest.raises(KeyError):
+        StageDefinitions(discover=False)['shout']
+    with pytest.raises(KeyError):
+        StageDefinitions()['not_a_stage']
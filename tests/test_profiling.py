@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+
+from processr.processr import process, process_many, DROPPED
+from processr.profiling import MemoryProfile, retains
+from processr.transformers import apply_map
+
+
+def make_padding(value):
+    return value + [str(i) * 1000 for i in range(100)]
+
+
+PIPELINE = [
+    ('filter_records', lambda d: d['id'] != 3),
+    ('transform_values', {'values': [make_padding, apply_map(str)]}),
+    ('rename_keys', {'id': 'record_id'}),
+]
+
+
+def test_retains():
+    value = [1, 2, 3]
+
+    assert retains((x for x in value), value)
+    assert not retains([x for x in value], value)
+    assert not retains(value, value)
+
+
+def test_process_memory_profile():
+    profile = MemoryProfile()
+
+    output = process({'id': 1, 'values': [1]}, PIPELINE,
+                     memory_profile=profile)
+    assert output['record_id'] == 1
+    assert list(profile.stages) == [
+        '0 filter_records', '1 transform_values', '2 rename_keys'
+    ]
+    assert profile.stages['1 transform_values'].allocated > 100 * 1000
+    assert profile.records == 1
+    assert profile.record_peak > 100 * 1000
+
+    padding = profile.transformers["1 transform_values['values']/0 "
+                                   "make_padding"]
+    assert padding.calls == 1
+    assert padding.retains_input == 0
+    mapper = profile.transformers["1 transform_values['values']/1 _map"]
+    assert mapper.retains_input == 1
+
+
+def test_process_memory_profile_dropped():
+    profile = MemoryProfile()
+
+    output = process({'id': 3, 'values': []}, PIPELINE,
+                     memory_profile=profile)
+    assert output is DROPPED
+    assert list(profile.stages) == ['0 filter_records']
+
+
+def test_process_many_memory_profile():
+    profile = MemoryProfile(batch_size=2)
+    records = [{'id': i, 'values': [i]} for i in range(5)]
+
+    output = list(process_many(records, PIPELINE, memory_profile=profile))
+    assert [d['record_id'] for d in output] == [0, 1, 2, 4]
+    assert profile.records == 4
+    assert len(profile.batch_peaks) == 2
+    assert profile.stages['1 transform_values'].calls == 4
+    # Retained outputs are charged to the stage which built them
+    assert profile.stages['1 transform_values'].retained > 4 * 100 * 1000
+    assert profile.stages['2 rename_keys'].retained < 100 * 1000
+    assert 'transform_values' in profile.report()
+
+
+def make_temporary(value):
+    # ~400 KB allocated and released during the call
+    padding = [str(i) * 100 for i in range(2000)]
+    return value + len(padding)
+
+
+def test_transformer_allocation_peak():
+    profile = MemoryProfile()
+    pipeline = [('transform_values', {'id': make_temporary})]
+
+    output = process({'id': 1}, pipeline, memory_profile=profile)
+    assert output == {'id': 2001}
+    temporary = profile.transformers["0 transform_values['id'] "
+                                     "make_temporary"]
+    assert temporary.allocated > 300 * 1000
+    assert temporary.retained < 10 * 1000
+    # The stage peak includes the one reached inside the transformer
+    assert profile.stages['0 transform_values'].allocated \
+        >= temporary.allocated
+    assert profile.record_peak >= temporary.allocated
+
+    list(process_many([{'id': 1}], pipeline, memory_profile=profile))
+    assert temporary.calls == 2
+    assert temporary.allocated > 2 * 300 * 1000
+    assert profile.record_peak >= temporary.allocated / 2
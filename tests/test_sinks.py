@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+
+import sqlite3
+
+from processr.processr import process_many
+from processr.sinks import SQLiteSink
+
+
+RECORDS = [
+    {'id': i, 'score': i / 2.0, 'name': 'record-%d' % i} for i in range(250)
+]
+
+
+def read(path, query):
+    connection = sqlite3.connect(path)
+    try:
+        return connection.execute(query).fetchall()
+    finally:
+        connection.close()
+
+
+def test_sqlite_sink(tmpdir):
+    path = str(tmpdir.join('sink.db'))
+    pipeline = [('filter_records', lambda d: d['id'] % 2 == 0)]
+
+    with SQLiteSink(path, 'records', batch_size=30) as sink:
+        sink.write(process_many(RECORDS, pipeline))
+        assert sink.rows == 125
+        assert sink.rate > 0
+
+    assert read(path, 'SELECT COUNT(*), SUM(id) FROM records') == \
+        [(125, sum(range(0, 250, 2)))]
+    columns = read(path, 'PRAGMA table_info(records)')
+    assert [(c[1], c[2]) for c in columns] == \
+        [('id', 'INTEGER'), ('score', 'REAL'), ('name', 'TEXT')]
+
+
+def test_sqlite_sink_columns(tmpdir):
+    path = str(tmpdir.join('sink.db'))
+
+    with SQLiteSink(path, 'records', columns=['name', 'missing']) as sink:
+        sink.write(RECORDS[:2])
+
+    assert read(path, 'SELECT * FROM records') == \
+        [('record-0', None), ('record-1', None)]
+
+
+def test_sqlite_sink_upsert_wal(tmpdir):
+    path = str(tmpdir.join('sink.db'))
+
+    with SQLiteSink(path, 'records', wal=True, upsert_keys='id') as sink:
+        sink.write(RECORDS[:10])
+        sink.write([{'id': 3, 'score': 42.0, 'name': 'updated'}])
+
+    assert read(path, 'PRAGMA journal_mode') == [('wal', )]
+    assert read(path, 'SELECT COUNT(*) FROM records') == [(10, )]
+    assert read(path, 'SELECT score, name FROM records WHERE id = 3') == \
+        [(42.0, 'updated')]
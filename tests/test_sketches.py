@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+
+from processr.sketches import HyperLogLog, TDigest
+
+
+def test_hyperloglog():
+    hll = HyperLogLog()
+    for value in range(100000):
+        hll.add('user-%d' % value)
+
+    assert abs(hll.count() - 100000) < 100000 * 0.05
+
+
+def test_hyperloglog_merge():
+    left, right = HyperLogLog(), HyperLogLog()
+    for value in range(1000):
+        left.add(value)
+        right.add(value + 500)
+
+    left.merge(right)
+    assert abs(left.count() - 1500) < 1500 * 0.05
+
+
+def test_tdigest_quantiles():
+    digest = TDigest()
+    for value in range(100000):
+        digest.add(value * 7919 % 100000)
+
+    assert abs(digest.quantile(0.5) - 50000) < 1000
+    assert abs(digest.quantile(0.99) - 99000) < 200
+    assert digest.quantile(0) == 0
+    assert digest.quantile(1) == 99999
+    assert len(digest._centroids) < 200
+
+
+def test_tdigest_merge():
+    left, right = TDigest(), TDigest()
+    for value in range(1000):
+        left.add(value)
+        right.add(value + 1000)
+
+    left.merge(right)
+    assert abs(left.quantile(0.25) - 500) < 20
+
+
+def test_tdigest_empty():
+    assert TDigest().quantile(0.5) is None
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+
+import random
+
+import pytest
+
+from processr.processr import process, process_many
+from processr.sorting import external_sort
+
+
+RECORDS = [{'score': random.Random(i).randint(0, 100), 'id': i}
+           for i in range(1000)]
+
+
+def test_external_sort(tmpdir):
+    output = external_sort(RECORDS, 'score', buffer_size=64,
+                           tmp_dir=str(tmpdir), block_size=10)
+
+    # Runs are spilled lazily, as soon as the output is consumed
+    first = next(output)
+    assert len(tmpdir.listdir()) == 0  # unnamed temporary files
+    assert [first] + list(output) == sorted(RECORDS,
+                                            key=lambda d: d['score'])
+
+
+def test_external_sort_reverse_callable():
+    key = lambda d: (d['score'], -d['id'])  # noqa: E731
+
+    output = external_sort(RECORDS, key, reverse=True, buffer_size=100)
+    assert list(output) == sorted(RECORDS, key=key, reverse=True)
+
+
+def test_external_sort_in_memory():
+    output = external_sort(RECORDS[:10], ('score', 'id'))
+    assert list(output) == sorted(RECORDS[:10],
+                                  key=lambda d: (d['score'], d['id']))
+
+
+def test_sort_by_stage():
+    pipeline = [
+        ('filter_records', lambda d: d['id'] % 2 == 0),
+        ('sort_by', {'key': 'score', 'buffer_size': 50}),
+    ]
+
+    output = list(process_many(RECORDS, pipeline))
+    assert output == sorted(RECORDS[::2], key=lambda d: d['score'])
+
+
+def test_top_k_stage():
+    pipeline = [('top_k', {'key': 'score', 'k': 3})]
+
+    output = list(process_many(RECORDS, pipeline))
+    assert output == sorted(RECORDS, key=lambda d: d['score'],
+                            reverse=True)[:3]
+
+
+def test_top_k_smallest():
+    pipeline = [('top_k', {'key': 'id', 'k': 2, 'largest': False})]
+
+    output = list(process_many(RECORDS, pipeline))
+    assert output == RECORDS[:2]
+
+
+@pytest.mark.parametrize('pipeline', [
+    [('sort_by', {'key': 'id'})],
+    [('top_k', {'key': 'id', 'k': 1})],
+])
+def test_stream_stages_single_record(pipeline):
+    with pytest.raises(TypeError):
+        process(RECORDS[0], pipeline)
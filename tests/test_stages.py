@@ -5,7 +5,20 @@ from processr.processr import (
     project_dict,
     transform_values,
     transform_dict,
-    transform_values_strict)
+    transform_values_strict,
+    enrich,
+    enrich_many,
+    filter_records,
+    filter_records_many,
+    when,
+    when_many,
+    branch,
+    branch_many,
+    process_many,
+    StageDefinitions,
+    DROPPED)
+from processr.aggregate import Aggregation
+from processr.lookup import HashIndex
 
 import pytest
 
@@ -115,3 +128,234 @@ def test_dict_transform():
     expected_output = {42: 'the_answer', 43: 'not_the_answer'}
     output = transform_dict(d, ops)
     assert output == expected_output
+
+
+##############################################################
+#                           enrich                           #
+##############################################################
+
+COUNTRIES = HashIndex(
+    [{'code': 'IT', 'country': 'Italy'}, {'code': 'FR', 'country': 'France'}],
+    'code'
+)
+
+
+def test_enrich():
+    d = {'country_code': 'IT', 'the_answer': 42}
+    opts = {'index': COUNTRIES, 'keys': 'country_code', 'fields': ['country']}
+
+    expected_output = {'country_code': 'IT', 'the_answer': 42,
+                       'country': 'Italy'}
+    output = enrich(d, opts)
+    assert output == expected_output
+
+
+def test_enrich_no_match():
+    d = {'code': 'DE'}
+    opts = {'index': COUNTRIES}
+
+    output = enrich(d, opts)
+    assert output == d
+    assert output is not d
+
+
+def test_enrich_many():
+    ds = [{'code': 'IT'}, {'code': 'DE'}, {'code': 'FR'}]
+    opts = {'index': COUNTRIES, 'chunk_size': 2}
+
+    expected_output = [
+        {'code': 'IT', 'country': 'Italy'},
+        {'code': 'DE'},
+        {'code': 'FR', 'country': 'France'},
+    ]
+    output = enrich_many(ds, opts)
+    assert list(output) == expected_output
+
+
+##############################################################
+#                       filter_records                       #
+##############################################################
+
+def test_filter_records():
+    d = {'the_answer': 42}
+
+    def opts(d):
+        return d['the_answer'] == 42
+
+    output = filter_records(d, opts)
+    assert output is d
+
+
+def test_filter_records_dropped():
+    d = {'the_answer': 54}
+    opts = [lambda d: d['the_answer'] % 2 == 0, lambda d: d['the_answer'] < 50]
+
+    output = filter_records(d, opts)
+    assert output is DROPPED
+
+
+def test_filter_records_many():
+    ds = [{'the_answer': 42}, {'the_answer': 54}, {'the_answer': 43}]
+    opts = [lambda d: d['the_answer'] % 2 == 0, lambda d: d['the_answer'] < 50]
+
+    output = filter_records_many(ds, opts)
+    assert list(output) == [{'the_answer': 42}]
+
+
+##############################################################
+#                       when & branch                        #
+##############################################################
+
+def test_when():
+    opts = {
+        'predicate': lambda d: d['the_answer'] == 42,
+        'pipeline': [('transform_values', {'the_answer': str})],
+    }
+
+    assert when({'the_answer': 42}, opts) == {'the_answer': '42'}
+    d = {'the_answer': 54}
+    assert when(d, opts) is d
+
+
+def test_when_many_dropped():
+    opts = {
+        'predicate': [lambda d: d['the_answer'] % 2 == 0],
+        'pipeline': [('filter_records', lambda d: d['the_answer'] > 50)],
+    }
+    ds = [{'the_answer': 42}, {'the_answer': 43}, {'the_answer': 54}]
+
+    output = when_many(ds, opts)
+    assert list(output) == [{'the_answer': 43}, {'the_answer': 54}]
+    assert when({'the_answer': 42}, opts) is DROPPED
+
+
+BRANCH_OPTS = {
+    'key': 'unit',
+    'branches': {
+        'km': [('transform_values', {'length': lambda v: v * 1000})],
+        'cm': [('transform_values', {'length': lambda v: v / 100.0}),
+               ('rename_keys', {'unit': 'source_unit'})],
+    },
+    'default': [('filter_records', lambda d: d.get('unit') == 'm')],
+    'chunk_size': 3,
+}
+
+
+def test_branch():
+    assert branch({'unit': 'km', 'length': 1}, BRANCH_OPTS) == \
+        {'unit': 'km', 'length': 1000}
+    assert branch({'unit': 'cm', 'length': 1}, BRANCH_OPTS) == \
+        {'source_unit': 'cm', 'length': 0.01}
+    assert branch({'unit': 'mi', 'length': 1}, BRANCH_OPTS) is DROPPED
+    assert branch({'length': 1}, BRANCH_OPTS) is DROPPED
+
+
+def test_branch_many_groups_chunks():
+    ds = [
+        {'unit': 'km', 'length': 1},
+        {'unit': 'm', 'length': 2},
+        {'unit': 'km', 'length': 3},
+        {'unit': 'cm', 'length': 400},
+        {'unit': 'mi', 'length': 5},
+    ]
+
+    output = list(branch_many(ds, BRANCH_OPTS))
+    assert output == [
+        {'unit': 'km', 'length': 1000},
+        {'unit': 'm', 'length': 2},
+        {'unit': 'km', 'length': 3000},
+        {'source_unit': 'cm', 'length': 4.0},
+    ]
+
+
+def test_branch_many_unordered():
+    opts = dict(BRANCH_OPTS, ordered=False)
+    opts['branches'] = dict(BRANCH_OPTS['branches'], m=[
+        ('aggregate', Aggregation('unit', {'length': ('sum', 'length')}))
+    ])
+    ds = [
+        {'unit': 'km', 'length': 1},
+        {'unit': 'm', 'length': 2},
+        {'unit': 'm', 'length': 3},
+        {'unit': 'cm', 'length': 400},
+        {'unit': 'km', 'length': 5},
+    ]
+
+    output = list(branch_many(ds, opts))
+    # Chunks of 3 records, grouped by branch in order of appearance;
+    # the aggregation sees one chunk at a time.
+    assert output == [
+        {'unit': 'km', 'length': 1000},
+        {'unit': 'm', 'length': 5},
+        {'source_unit': 'cm', 'length': 4.0},
+        {'unit': 'km', 'length': 5000},
+    ]
+
+
+class CountingIndex(HashIndex):
+
+    def __init__(self, *args, **kwargs):
+        super(CountingIndex, self).__init__(*args, **kwargs)
+        self.lookups = 0
+
+    def get_many(self, keys):
+        self.lookups += 1
+        return super(CountingIndex, self).get_many(keys)
+
+
+def test_branch_many_batch_handlers():
+    index = CountingIndex(
+        [{'code': 'IT', 'country': 'Italy'},
+         {'code': 'FR', 'country': 'France'}], 'code')
+    opts = {
+        'key': 'source',
+        'branches': {'raw': [('filter_records', lambda d: d['code'])]},
+        'default': [('enrich', {'index': index})],
+        'chunk_size': 4,
+    }
+    ds = [
+        {'source': 'feed', 'code': 'IT'},
+        {'source': 'raw', 'code': ''},
+        {'source': 'feed', 'code': 'FR'},
+        {'source': 'raw', 'code': 'DE'},
+        {'source': 'feed', 'code': 'DE'},
+    ]
+
+    output = list(branch_many(ds, opts))
+    assert output == [
+        {'source': 'feed', 'code': 'IT', 'country': 'Italy'},
+        {'source': 'feed', 'code': 'FR', 'country': 'France'},
+        {'source': 'raw', 'code': 'DE'},
+        {'source': 'feed', 'code': 'DE'},
+    ]
+    # One lookup for the default branch of each chunk
+    assert index.lookups == 2
+
+
+def test_branch_many_stream_stages():
+    opts = {'key': 'unit', 'branches': {},
+            'default': [('top_k', {'key': 'length', 'k': 1})]}
+    ds = [{'unit': 'm', 'length': length} for length in (2, 5, 3)]
+
+    with pytest.raises(TypeError):
+        list(branch_many(ds, opts))
+
+    unordered = dict(opts, ordered=False)
+    output = list(branch_many(ds, unordered))
+    assert output == [{'unit': 'm', 'length': 5}]
+
+
+def test_branch_callable_key_and_stage_definitions():
+    def double(d, stage_opts):
+        return dict(d, value=d['value'] * 2)
+
+    stage_definitions = StageDefinitions()
+    stage_definitions['double'] = double
+    opts = {
+        'key': lambda d: d['value'] % 2,
+        'branches': {0: [('double', None)]},
+        'stage_definitions': stage_definitions,
+    }
+
+    output = process_many([{'value': 1}, {'value': 2}], [('branch', opts)])
+    assert list(output) == [{'value': 1}, {'value': 4}]
@@ -1,11 +1,17 @@
 # -*- coding: utf-8 -*-
 
+import re
+from datetime import datetime, timedelta, timezone
+
 import pytest
 
 from processr.transformers import (apply_default, set_value, get_value,
                                    copy_value, copy_value_strict,
                                    passthrough_on_exception, apply_map,
-                                   apply_filter)
+                                   apply_filter, parse_int, parse_float,
+                                   parse_bool, parse_datetime, strip, lower,
+                                   split)
+from processr import transformers
 
 
 class DummyException(Exception):
@@ -198,3 +204,97 @@ def test_passthrough():
 
     output = wrapped_raiser(input)
     assert input == output
+
+
+def test_parse_int():
+    parser = parse_int(default=-1)
+
+    assert parser(' 42 ') == 42
+    assert parser('') == -1
+    assert parser.many(['1', '2', None]) == [1, 2, -1]
+    with pytest.raises(ValueError):
+        parser('forty-two')
+    with pytest.raises(ValueError):
+        parser.many(['1', 'forty-two'])
+
+
+def test_parse_not_strict():
+    parser = parse_float(default=0.0, strict=False)
+
+    assert parser.many(['1.5', 'n/a', None, 2]) == [1.5, 0.0, 0.0, 2.0]
+
+
+def test_parse_many_numpy(monkeypatch):
+    numpy = pytest.importorskip('numpy')
+    monkeypatch.setattr(transformers, 'numpy', numpy)
+    values = [str(i) for i in range(100)]
+
+    assert parse_int().many(values) == list(range(100))
+    assert parse_int(strict=False).many(['1.5'] * 100) == [None] * 100
+    assert parse_float().many(values + ['0.5']) == \
+        [float(i) for i in range(100)] + [0.5]
+
+
+def test_parse_bool():
+    parser = parse_bool()
+
+    assert parser.many(['TRUE', ' no ', 'On', 1, False, None]) == [
+        True, False, True, True, False, None
+    ]
+    with pytest.raises(ValueError):
+        parser('maybe')
+    with pytest.raises(ValueError):
+        parser(2)
+
+
+@pytest.mark.parametrize('value, expected', [
+    ('2016-04-03', datetime(2016, 4, 3)),
+    ('2016-04-03T10:30:15.5', datetime(2016, 4, 3, 10, 30, 15, 500000)),
+    ('2016-04-03T10:30:15Z',
+     datetime(2016, 4, 3, 10, 30, 15, tzinfo=timezone.utc)),
+    ('20160403T103015+0130', datetime(
+        2016, 4, 3, 10, 30, 15,
+        tzinfo=timezone(timedelta(hours=1, minutes=30)))),
+    ('2016-04-03 10:30:15,1234567-02:00', datetime(
+        2016, 4, 3, 10, 30, 15, 123456,
+        tzinfo=timezone(-timedelta(hours=2)))),
+])
+def test_parse_datetime(value, expected):
+    assert parse_datetime()(value) == expected
+    assert transformers._parse_iso_datetime(value) == expected
+
+
+def test_parse_datetime_many():
+    parser = parse_datetime(strict=False)
+
+    assert parser.many(['2016-04-03', '20160403', 'yesterday', None]) == [
+        datetime(2016, 4, 3), datetime(2016, 4, 3), None, None
+    ]
+
+
+def test_string_parsers():
+    assert strip().many([' a ', None, '']) == ['a', None, None]
+    assert lower()('The Answer') == 'the answer'
+    assert split()('a b  c') == ['a', 'b', 'c']
+    assert split(',', maxsplit=1)('a,b,c') == ['a', 'b,c']
+    assert split(re.compile(r'[,;]'), strip=True).many(['a; b,,c']) == [
+        ['a', 'b', 'c']
+    ]
+    with pytest.raises(TypeError):
+        strip()(42)
+
+
+@pytest.mark.parametrize('parser, values', [
+    (strip(), ['', ' a ', None]),
+    (lower(), ['', 'A']),
+    (parse_float(null_values=(None, '', 'nan'), default=0.0), ['nan', '1']),
+    (parse_bool(null_values=(None, '', 'n/a')), ['n/a', 'yes']),
+    (split(null_values=(None, '', '-')), ['-', 'a b']),
+])
+def test_parse_many_null_values(parser, values):
+    assert parser.many(values) == [parser(value) for value in values]
+
+
+def test_parser_is_abstract():
+    with pytest.raises(TypeError):
+        transformers.Parser()